@@ -0,0 +1,73 @@
+# agregacoes.py
+# Agregações em fluxo sobre os arquivos oficiais: memória constante, qualquer tamanho de arquivo
+from collections import Counter
+import pandas as pd
+from dados_publicos import DATA_PATH, ARQUIVOS_PUBLICOS, abrir_tabela_arrow, arquivos_partes, ler_csv_em_blocos
+
+def arquivos_dispensas():
+    """Arquivos de dispensas: o arquivo completo ou, na falta dele, as partes _1, _2, ..."""
+    completo = DATA_PATH / ARQUIVOS_PUBLICOS['dispensas']
+    if completo.exists():
+        return [completo]
+    # As partes são uma divisão do arquivo completo: ler os dois duplicaria as contagens
+    return arquivos_partes('dispensas')
+
+def agregar_dispensas(blocos):
+    """Acumula contagens mensais, por tipo de serviço e por tipo de profissional"""
+    mensal = Counter()
+    servico = Counter()
+    profissional = Counter()
+
+    for bloco in blocos:
+        if 'dt_disp' in bloco.columns:
+            mensal.update(bloco['dt_disp'].dt.to_period('M').value_counts().to_dict())
+        if 'tp_servico_atendimento' in bloco.columns:
+            servico.update(bloco['tp_servico_atendimento'].value_counts().to_dict())
+        if 'tp_profissional' in bloco.columns:
+            profissional.update(bloco['tp_profissional'].value_counts().to_dict())
+
+    return {
+        'mensal': _serie_mensal(mensal),
+        'servico': _tabela_contagem(servico, 'tp_servico_atendimento'),
+        'profissional': _tabela_contagem(profissional, 'tp_profissional'),
+    }
+
+def _serie_mensal(contagem):
+    # Mesmo formato do antigo resample('M').size(): meses sem dispensas aparecem com zero
+    if not contagem:
+        return pd.DataFrame(columns=['dt_disp', 'count'])
+    serie = pd.Series(contagem).sort_index()
+    meses = pd.period_range(serie.index.min(), serie.index.max(), freq='M')
+    serie = serie.reindex(meses, fill_value=0)
+    return pd.DataFrame({'dt_disp': meses.to_timestamp(), 'count': serie.to_numpy()})
+
+def _tabela_contagem(contagem, coluna):
+    tabela = pd.DataFrame(list(contagem.items()), columns=[coluna, 'count'])
+    tabela = tabela[tabela['count'] > 0]
+    return tabela.sort_values('count', ascending=False, ignore_index=True)
+
+COLUNAS_AGREGADAS = ['dt_disp', 'tp_servico_atendimento', 'tp_profissional']
+
+def _blocos_cache(tamanho_bloco):
+    # Lotes do cache Arrow mapeado em memória: só o lote atual vira DataFrame
+    tabela = abrir_tabela_arrow('dispensas', COLUNAS_AGREGADAS)
+    for lote in tabela.to_batches(max_chunksize=tamanho_bloco):
+        yield lote.to_pandas()
+
+def agregar_dispensas_publicas(tamanho_bloco=250_000):
+    """Agrega as dispensas em blocos.
+
+    Lê o cache colunar, que é a mesma união sem duplicatas do arquivo completo e
+    das partes usada pelo banco SQLite: os recortes de período batem com o total.
+    Sem pyarrow (e portanto sem cache nem banco), lê os CSVs diretamente.
+    """
+    try:
+        return agregar_dispensas(_blocos_cache(tamanho_bloco))
+    except ImportError:
+        return agregar_dispensas(ler_csv_em_blocos(arquivos_dispensas(), 'dispensas', tamanho_bloco))
+
+if __name__ == "__main__":
+    resultado = agregar_dispensas_publicas()
+    for chave, tabela in resultado.items():
+        print(f"\n{chave}:")
+        print(tabela.to_string(index=False))
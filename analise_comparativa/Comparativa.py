@@ -1,18 +1,31 @@
 # Análise Comparativa/Comparativa.py
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-from database import buscar_respostas
-from analysis import carregar_dados_publicos
+from database import buscar_respostas, contar_opcoes
+from graficos import grafico_barras, exibir_grafico
+from cubo import consultar_cubo, dimensoes_disponiveis
+
+# Colunas da pesquisa e suas equivalentes nos dados oficiais
+COLUNAS_OFICIAIS = {
+    'raca': 'raca4_cat',
+    'idade': 'fetar',
+    'genero': 'Pop_genero_pratica',
+    'escolaridade': 'escol4',
+    'renda': 'renda',
+    'regiao': 'UF_UDM'
+}
 
 def mostrar_pagina_comparativa():
 
     st.header("🔬 Comparação: Pesquisa vs Dados Oficiais")
 
     df_pesquisa = buscar_respostas()
-    df_publico, _, _ = carregar_dados_publicos()
+    try:
+        dimensoes_publicas = dimensoes_disponiveis()
+    except FileNotFoundError:
+        dimensoes_publicas = []
 
-    if df_pesquisa is None or df_publico is None or df_pesquisa.empty or df_publico.empty:
+    if df_pesquisa is None or df_pesquisa.empty or not dimensoes_publicas:
         st.warning("Precisa de dados da pesquisa e públicos para comparar")
         return
 
@@ -20,9 +33,9 @@ def mostrar_pagina_comparativa():
     def comparar_pesquisa(col, titulo, rotulo):
         dist = df_pesquisa[col].value_counts(normalize=True).reset_index()
         dist.columns = [rotulo, 'percentual']
-        fig = px.bar(dist, x=rotulo, y='percentual', title=titulo,
-                     labels={'percentual': 'Percentual', rotulo: rotulo})
-        st.plotly_chart(fig, use_container_width=True)
+        fig = grafico_barras(dist, rotulo, 'percentual', titulo=titulo,
+                             labels={'percentual': 'Percentual', rotulo: rotulo})
+        exibir_grafico(fig)
 
     # Novos campos exclusivos da pesquisa
     if 'status_relacional' in df_pesquisa.columns:
@@ -33,31 +46,27 @@ def mostrar_pagina_comparativa():
         st.subheader("Objetivo do uso da PrEP (Pesquisa)")
         comparar_pesquisa('objetivo_prep', 'Objetivo do uso da PrEP', 'Objetivo PrEP')
 
-    # Filtrar dados públicos para SP
-    df_publico_sp = df_publico[df_publico['UF_UDM'] == 'SP'].copy()
-    df_publico_sp = df_publico_sp.rename(columns={
-        'raca4_cat': 'raca',
-        'fetar': 'idade',
-        'Pop_genero_pratica': 'genero',
-        'escol4': 'escolaridade',
-        'renda': 'renda',
-        'UF_UDM': 'regiao'
-    })
+    # Dados públicos de SP: contagens vindas do cubo pré-calculado
+    def distribuicao_publica_sp(col_pesquisa):
+        col_oficial = COLUNAS_OFICIAIS[col_pesquisa]
+        contagem = consultar_cubo([col_oficial], {'UF_UDM': 'SP'})
+        return pd.Series(contagem['contagem'].to_numpy(), index=contagem[col_oficial].astype(str))
 
     def comparar_coluna(col_pesquisa, col_publico, titulo, rotulo):
         dist_pesquisa = df_pesquisa[col_pesquisa].value_counts(normalize=True).reset_index()
         dist_pesquisa.columns = [rotulo, 'percentual']
         dist_pesquisa['fonte'] = 'Nossa Pesquisa'
 
-        dist_publico = df_publico_sp[col_publico].value_counts(normalize=True).reset_index()
+        contagem_publico = distribuicao_publica_sp(col_publico)
+        dist_publico = (contagem_publico / contagem_publico.sum()).reset_index()
         dist_publico.columns = [rotulo, 'percentual']
         dist_publico['fonte'] = 'Dados Oficiais (SP)'
 
         df_comparativo = pd.concat([dist_pesquisa, dist_publico])
-        fig = px.bar(df_comparativo, x=rotulo, y='percentual', color='fonte',
-                     barmode='group', title=titulo,
-                     labels={'percentual': 'Percentual', rotulo: rotulo})
-        st.plotly_chart(fig, use_container_width=True)
+        fig = grafico_barras(df_comparativo, rotulo, 'percentual', color='fonte',
+                             barmode='group', titulo=titulo,
+                             labels={'percentual': 'Percentual', rotulo: rotulo})
+        exibir_grafico(fig)
 
     st.subheader("Comparativo por Raça/Cor")
     comparar_coluna('raca', 'raca', 'Distribuição por Raça/Cor', 'Raça/Cor')
@@ -72,11 +81,11 @@ def mostrar_pagina_comparativa():
     comparar_coluna('escolaridade', 'escolaridade', 'Distribuição por Escolaridade', 'Escolaridade')
 
     # Renda e Região podem não existir nos dados oficiais, mas tentamos
-    if 'renda' in df_pesquisa.columns and 'renda' in df_publico_sp.columns:
+    if 'renda' in df_pesquisa.columns and COLUNAS_OFICIAIS['renda'] in dimensoes_publicas:
         st.subheader("Comparativo por Renda")
         comparar_coluna('renda', 'renda', 'Distribuição por Renda', 'Renda')
 
-    if 'regiao' in df_pesquisa.columns and 'regiao' in df_publico_sp.columns:
+    if 'regiao' in df_pesquisa.columns and COLUNAS_OFICIAIS['regiao'] in dimensoes_publicas:
         st.subheader("Comparativo por Região")
         comparar_coluna('regiao', 'regiao', 'Distribuição por Região', 'Região')
 
@@ -84,9 +93,9 @@ def mostrar_pagina_comparativa():
     def comparar_pesquisa(col, titulo, rotulo):
         dist = df_pesquisa[col].value_counts(normalize=True).reset_index()
         dist.columns = [rotulo, 'percentual']
-        fig = px.bar(dist, x=rotulo, y='percentual', title=titulo,
-                     labels={'percentual': 'Percentual', rotulo: rotulo})
-        st.plotly_chart(fig, use_container_width=True)
+        fig = grafico_barras(dist, rotulo, 'percentual', titulo=titulo,
+                             labels={'percentual': 'Percentual', rotulo: rotulo})
+        exibir_grafico(fig)
 
     st.subheader("Conhecimento sobre PrEP (Pesquisa)")
     comparar_pesquisa('conhecimento_prep', 'Conhecimento sobre PrEP', 'Conhecimento PrEP')
@@ -94,8 +103,17 @@ def mostrar_pagina_comparativa():
     st.subheader("Uso de PrEP (Pesquisa)")
     comparar_pesquisa('uso_prep', 'Uso de PrEP', 'Uso PrEP')
 
+    # Múltipla escolha: cada opção marcada conta, em percentual das respostas
+    def comparar_opcoes(campo, titulo, rotulo):
+        dist = contar_opcoes(campo)
+        dist['percentual'] = dist['respostas'] / len(df_pesquisa)
+        dist = dist.rename(columns={'opcao': rotulo})[[rotulo, 'percentual']]
+        fig = grafico_barras(dist, rotulo, 'percentual', titulo=titulo,
+                             labels={'percentual': 'Percentual', rotulo: rotulo})
+        exibir_grafico(fig)
+
     st.subheader("Barreiras para uso de PrEP (Pesquisa)")
-    comparar_pesquisa('barreiras', 'Barreiras para uso de PrEP', 'Barreiras')
+    comparar_opcoes('barreiras', 'Barreiras para uso de PrEP', 'Barreiras')
 
     st.subheader("Percepção de risco de HIV (Pesquisa)")
     comparar_pesquisa('percepcao_risco', 'Percepção de risco de HIV', 'Percepção de Risco')
@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 # analise_simulacao.py - Análise dos dados simulados
 
-import sqlite3
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
+from collections import Counter
+from conexao import conexao
+from database import contar_opcoes
 
 def analisar_dados_simulados():
     """Análise completa dos dados simulados"""
@@ -12,9 +14,8 @@ def analisar_dados_simulados():
     print("=" * 50)
     
     # Conectar ao banco
-    conn = sqlite3.connect('pesquisa_prep.db')
-    df = pd.read_sql("SELECT * FROM respostas", conn)
-    conn.close()
+    with conexao() as conn:
+        df = pd.read_sql("SELECT * FROM respostas", conn)
     
     print(f"📈 Total de respostas: {len(df)}")
     print(f"📅 Período: {df['data_envio'].min()} até {df['data_envio'].max()}")
@@ -53,18 +54,11 @@ def analisar_dados_simulados():
     
     # Análise de barreiras mais comuns
     print("🚧 Barreiras mais mencionadas:")
-    todas_barreiras = []
-    for barreiras in df['barreiras'].dropna():
-        if barreiras:
-            todas_barreiras.extend([b.strip() for b in barreiras.split(',')])
-    
-    from collections import Counter
-    contador_barreiras = Counter(todas_barreiras)
-    
-    for barreira, count in contador_barreiras.most_common(10):
-        if barreira:
-            porcentagem = (count / len(df)) * 100
-            print(f"   {barreira}: {count} ({porcentagem:.1f}%)")
+    contagem_barreiras = contar_opcoes('barreiras')
+    
+    for barreira, count in contagem_barreiras.head(10).itertuples(index=False):
+        porcentagem = (count / len(df)) * 100
+        print(f"   {barreira}: {count} ({porcentagem:.1f}%)")
     print()
     
     # Análise cruzada: Conhecimento x Escolaridade
@@ -1,8 +1,16 @@
 # analysis.py
 import streamlit as st
+import numpy as np
 import pandas as pd
-import plotly.express as px
-from pathlib import Path
+from dados_publicos import versao_dataset
+from agregacoes import agregar_dispensas_publicas
+from cubo import consultar_cubo, dimensoes_disponiveis
+from graficos import grafico_pizza, grafico_barras, grafico_linha, grafico_calor, exibir_grafico
+from indicadores import carregar_indicadores, versao_indicadores
+from consultas_publicas import contar
+from tendencias import atualizar_rollup, series_mensais, taxas, projetar
+from coortes import carregar_coortes, curva_retencao, matriz_retencao
+from modelos import VARIAVEIS, artefato_atual, carregar_modelo, coeficientes
 
 # Mapeamento para nomes mais compreensíveis
 TRADUCOES = {
@@ -14,93 +22,298 @@ TRADUCOES = {
     'Disp_12m_2024': 'Continuou no Programa em 2024'
 }
 
-@st.cache_data
-def carregar_dados_publicos():
-    data_path = Path('data')
+@st.cache_data(show_spinner="Carregando indicadores...")
+def _indicadores(versao):
+    return carregar_indicadores()
+
+def carregar_indicadores_tidy():
+    """Indicadores de AIDS em formato tidy, sem reler a planilha Excel"""
+    return _indicadores(versao_indicadores())
+
+@st.cache_data(show_spinner="Agregando dispensas...")
+def _agregar_dispensas(versao):
+    # 'versao' só entra na chave do cache: muda quando o dataset muda
+    return agregar_dispensas_publicas()
+
+@st.cache_data(show_spinner="Consultando dispensas do período...")
+def _dispensas_no_periodo(versao, inicio, fim):
+    # Filtro e agrupamentos executados no banco indexado por dt_disp
+    periodo = (f'{inicio}-01', (pd.Period(fim, freq='M') + 1).strftime('%Y-%m-01'))
+    mensal = contar('dispensas', ['mes'], periodo=periodo)
+    # Meses sem dispensas aparecem com zero, como na agregação do período completo
+    meses = pd.period_range(inicio, fim, freq='M')
+    mensal = mensal.set_index(pd.PeriodIndex(mensal['mes'], freq='M'))['contagem'].reindex(meses, fill_value=0)
+    mensal = pd.DataFrame({'dt_disp': meses.to_timestamp(), 'count': mensal.to_numpy()})
+    servico = contar('dispensas', ['tp_servico_atendimento'], periodo=periodo)
+    profissional = contar('dispensas', ['tp_profissional'], periodo=periodo)
+    return {
+        'mensal': mensal,
+        'servico': servico.rename(columns={'contagem': 'count'}),
+        'profissional': profissional.rename(columns={'contagem': 'count'}),
+    }
+
+def carregar_agregados_dispensas():
     try:
-        df_usuarios = pd.read_csv(data_path / 'Banco_PrEP_usuarios.csv', encoding='latin1', sep=',')
-        df_dispensas = pd.read_csv(data_path / 'Banco_PrEP_dispensas.csv', encoding='latin1', sep=',')
-        df_indicadores = pd.read_excel(data_path / 'indicadoresAids.xls', sheet_name=None, header=None)
-        return df_usuarios, df_dispensas, df_indicadores
+        return _agregar_dispensas(versao_dataset('dispensas'))
     except FileNotFoundError:
-        st.error("Arquivos de dados não encontrados na pasta 'data'")
-        return pd.DataFrame(), pd.DataFrame(), None
+        return None
 
 def traduzir_colunas(df):
     return df.rename(columns=TRADUCOES)
 
+def contagem_publica(coluna, filtros=None):
+    """Contagem de usuários por categoria, respondida pelo cubo pré-calculado"""
+    tabela = consultar_cubo([coluna], filtros)
+    tabela = tabela.sort_values('contagem', ascending=False, ignore_index=True)
+    return traduzir_colunas(tabela)
+
+# Seções da página de dados oficiais
+SECOES_DADOS_OFICIAIS = ["👤 Perfil dos Usuários", "💊 Dispensas", "📈 Tendências", "🔁 Coortes",
+                         "🔍 Análises Avançadas", "📉 Indicadores de AIDS"]
+
+def mostrar_secao_sob_demanda(secoes, chave):
+    """Mostra apenas a seção escolhida.
+
+    Diferente de st.tabs, que executa o corpo de todas as abas a cada rerun,
+    as seções não selecionadas não carregam dados nem montam gráficos.
+    """
+    escolha = st.radio("Seção:", list(secoes), horizontal=True, key=chave, label_visibility="collapsed")
+    secoes[escolha]()
+
 def mostrar_dados_oficiais():
     st.header("📊 Dados Oficiais sobre PrEP")
     
-    df_usuarios, df_dispensas, df_indicadores = carregar_dados_publicos()
-    
-    if df_usuarios.empty:
+    try:
+        dimensoes = dimensoes_disponiveis()
+    except FileNotFoundError:
+        st.error("Arquivos de dados não encontrados na pasta 'data'")
         st.warning("Dados não carregados")
         return
-
-    df_usuarios_traduzido = traduzir_colunas(df_usuarios)
     
     st.info("💡 Dados públicos do Ministério da Saúde sobre usuários de PrEP")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["👤 Perfil dos Usuários", "💊 Dispensas", "📈 Tendências", "🔍 Análises Avançadas"])
-    
-    with tab1:
+    (secao_perfil, secao_dispensas, secao_tendencias, secao_coortes,
+     secao_avancada, secao_indicadores) = SECOES_DADOS_OFICIAIS
+    mostrar_secao_sob_demanda({
+        secao_perfil: lambda: mostrar_perfil_usuarios(dimensoes),
+        secao_dispensas: mostrar_dispensas,
+        secao_tendencias: mostrar_tendencias,
+        secao_coortes: mostrar_coortes,
+        secao_avancada: mostrar_analises_avancadas,
+        secao_indicadores: mostrar_indicadores,
+    }, chave='secao_dados_oficiais')
+
+def mostrar_perfil_usuarios(dimensoes):
+    col1, col2 = st.columns(2)
+    with col1:
+        if 'raca4_cat' in dimensoes:
+            fig_raca = grafico_pizza(contagem_publica('raca4_cat'), 'Raça/Cor', 'contagem',
+                                     titulo="Distribuição por Raça/Cor")
+            exibir_grafico(fig_raca)
+        
+        if 'escol4' in dimensoes:
+            fig_esc = grafico_barras(contagem_publica('escol4'), 'Escolaridade', 'contagem',
+                                     titulo="Nível de Escolaridade")
+            exibir_grafico(fig_esc)
+            
+    with col2:
+        if 'fetar' in dimensoes:
+            fig_idade = grafico_pizza(contagem_publica('fetar'), 'Faixa Etária', 'contagem',
+                                      titulo="Distribuição por Idade")
+            exibir_grafico(fig_idade)
+        
+        if 'Pop_genero_pratica' in dimensoes:
+            fig_pop = grafico_barras(contagem_publica('Pop_genero_pratica'), 'População/Gênero', 'contagem',
+                                     titulo="População/Gênero")
+            exibir_grafico(fig_pop)
+
+def mostrar_dispensas():
+    agregados = carregar_agregados_dispensas()
+    if agregados is not None:
+        meses = list(agregados['mensal']['dt_disp'].dt.strftime('%Y-%m'))
+        if len(meses) > 1:
+            inicio, fim = st.select_slider("Período:", options=meses, value=(meses[0], meses[-1]))
+            if (inicio, fim) != (meses[0], meses[-1]):
+                agregados = _dispensas_no_periodo(versao_dataset('dispensas'), inicio, fim)
+
+        st.subheader("Dispensas de PrEP ao Longo do Tempo")
+        fig_tempo = grafico_linha(agregados['mensal'], 'dt_disp', 'count', 
+                                  titulo='Evolução Mensal das Dispensas de PrEP')
+        exibir_grafico(fig_tempo)
+        
+        st.subheader("Tipos de Serviços")
         col1, col2 = st.columns(2)
         with col1:
-            if 'Raça/Cor' in df_usuarios_traduzido.columns:
-                fig_raca = px.pie(df_usuarios_traduzido, names='Raça/Cor', 
-                                title="Distribuição por Raça/Cor")
-                st.plotly_chart(fig_raca, use_container_width=True)
-            
-            if 'Escolaridade' in df_usuarios_traduzido.columns:
-                fig_esc = px.bar(df_usuarios_traduzido['Escolaridade'].value_counts(),
-                               title="Nível de Escolaridade")
-                st.plotly_chart(fig_esc, use_container_width=True)
-                
+            fig_serv = grafico_pizza(agregados['servico'], 'tp_servico_atendimento', 'count',
+                                     titulo="Tipo de Serviço")
+            exibir_grafico(fig_serv)
         with col2:
-            if 'Faixa Etária' in df_usuarios_traduzido.columns:
-                fig_idade = px.pie(df_usuarios_traduzido, names='Faixa Etária',
-                                 title="Distribuição por Idade")
-                st.plotly_chart(fig_idade, use_container_width=True)
-            
-            if 'População/Gênero' in df_usuarios_traduzido.columns:
-                fig_pop = px.bar(df_usuarios_traduzido['População/Gênero'].value_counts(),
-                               title="População/Gênero")
-                st.plotly_chart(fig_pop, use_container_width=True)
-
-    with tab2:
-        if not df_dispensas.empty:
-            st.subheader("Dispensas de PrEP ao Longo do Tempo")
-            df_dispensas['dt_disp'] = pd.to_datetime(df_dispensas['dt_disp'], errors='coerce')
-            disp_por_mes = df_dispensas.set_index('dt_disp').resample('M').size().reset_index(name='count')
-            fig_tempo = px.line(disp_por_mes, x='dt_disp', y='count', 
-                              title='Evolução Mensal das Dispensas de PrEP')
-            st.plotly_chart(fig_tempo, use_container_width=True)
-            
-            st.subheader("Tipos de Serviços")
-            col1, col2 = st.columns(2)
-            with col1:
-                fig_serv = px.pie(df_dispensas, names='tp_servico_atendimento', 
-                                title="Tipo de Serviço")
-                st.plotly_chart(fig_serv, use_container_width=True)
-            with col2:
-                fig_prof = px.pie(df_dispensas, names='tp_profissional', 
-                                title="Tipo de Profissional")
-                st.plotly_chart(fig_prof, use_container_width=True)
-
-    with tab3:
-        st.subheader("Análises de Tendência")
-        st.info("Em breve: Análises de tendência temporal e projeções")
-
-    with tab4:
-        st.subheader("Análises Avançadas com Machine Learning")
-        analise_avancada_publico(df_usuarios)
-
-def analise_avancada_publico(df_usuarios):
+            fig_prof = grafico_pizza(agregados['profissional'], 'tp_profissional', 'count',
+                                     titulo="Tipo de Profissional")
+            exibir_grafico(fig_prof)
+
+@st.cache_data(show_spinner="Atualizando consolidação mensal...")
+def _rollup_mensal(versao_usuarios, versao_dispensas):
+    return atualizar_rollup()
+
+def mostrar_tendencias():
+    st.subheader("Análises de Tendência")
+    try:
+        rollup = _rollup_mensal(versao_dataset('usuarios'), versao_dataset('dispensas'))
+    except FileNotFoundError:
+        st.error("Arquivos de dados não encontrados na pasta 'data'")
+        return
+    if rollup.empty:
+        st.warning("Sem dispensas para analisar.")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        metrica = st.radio("Métrica:", ['dispensas', 'novos_usuarios'],
+                           format_func=lambda m: {'dispensas': 'Dispensas', 'novos_usuarios': 'Novos usuários'}[m])
+    with col2:
+        dimensao = st.radio("Agrupar por:", ['UF_UDM', 'Pop_genero_pratica'], format_func=TRADUCOES.get)
+    with col3:
+        horizonte = st.slider("Meses projetados:", 1, 12, 6)
+
+    matriz = series_mensais(rollup, dimensao, metrica)
+    ordem = matriz.sum().sort_values(ascending=False).index
+    escolhidas = st.multiselect("Séries:", list(ordem), default=list(ordem[:5]))
+    if not escolhidas:
+        st.info("Selecione ao menos uma série.")
+        return
+
+    media_movel, variacao_anual = taxas(matriz)
+    projecao = projetar(matriz, horizonte=horizonte)
+
+    def formato_longo(df, tipo):
+        longo = df[escolhidas].rename_axis('mes').reset_index().melt(id_vars='mes', var_name='serie', value_name='valor')
+        longo['mes'] = longo['mes'].dt.to_timestamp()
+        longo['tipo'] = tipo
+        return longo
+
+    grafico = pd.concat([formato_longo(media_movel, 'Média móvel (3 meses)'),
+                         formato_longo(projecao, 'Projeção')])
+    fig = grafico_linha(grafico, 'mes', 'valor', titulo="Evolução mensal e projeção",
+                        color='serie', line_dash='tipo')
+    exibir_grafico(fig)
+
+    resumo = pd.DataFrame({
+        'Último mês': matriz[escolhidas].iloc[-1],
+        'Média 3 meses': media_movel[escolhidas].iloc[-1].round(1),
+        'Variação anual (%)': (variacao_anual[escolhidas].iloc[-1] * 100).round(1),
+        f'Projeção +{horizonte} meses': projecao[escolhidas].iloc[-1].round(0) if not projecao.empty else None,
+    })
+    st.dataframe(resumo)
+
+@st.cache_data(show_spinner="Calculando coortes...")
+def _coortes(versao_usuarios, versao_dispensas):
+    return carregar_coortes()
+
+def mostrar_coortes():
+    st.subheader("Retenção por Coorte")
+    st.caption("Usuários agrupados pelo mês da primeira dispensa; cada célula é a fração da coorte "
+               "com dispensa N meses depois. Células em branco ainda não são observáveis.")
+    try:
+        coortes = _coortes(versao_dataset('usuarios'), versao_dataset('dispensas'))
+    except FileNotFoundError:
+        st.error("Arquivos de dados não encontrados na pasta 'data'")
+        return
+    if coortes.empty:
+        st.warning("Sem dispensas de usuários cadastrados para analisar.")
+        return
+
+    acompanhados = int(coortes['meses_desde_inicio'].max())
+    # Com até um mês de acompanhamento não há faixa para escolher (o slider exige mínimo < máximo)
+    meses = st.slider("Meses acompanhados:", 1, acompanhados, min(12, acompanhados)) if acompanhados > 1 else acompanhados
+    matriz = matriz_retencao(coortes, meses=meses)
+    fig = grafico_calor(matriz, titulo="Retenção por coorte (fração de usuários ativos)",
+                        labels={'x': 'Meses desde a primeira dispensa', 'y': 'Coorte', 'color': 'Retenção'},
+                        color_continuous_scale='Blues', zmin=0, zmax=1)
+    exibir_grafico(fig)
+
+    media = curva_retencao(coortes, matriz)
+    curva = pd.DataFrame({'Meses desde a primeira dispensa': matriz.columns, 'Retenção média': media.to_numpy()})
+    exibir_grafico(grafico_linha(curva, 'Meses desde a primeira dispensa', 'Retenção média',
+                                 titulo="Curva média de retenção (coortes observadas em cada mês, "
+                                        "ponderada pelo tamanho)"))
+
+def mostrar_analises_avancadas():
+    st.subheader("Análises Avançadas com Machine Learning")
+    analise_avancada_publico()
+
+@st.cache_resource(max_entries=1)
+def _modelo_retencao(versao_dados, treinado_em):
+    # O modelo é só carregado aqui: o treino roda fora do Streamlit (python modelos.py treinar)
+    return carregar_modelo({'versao_dados': versao_dados})
+
+def analise_avancada_publico():
     st.header("🤖 Análise Avançada com Machine Learning")
     st.info("Esta análise utiliza os dados públicos para identificar padrões.")
-    st.warning("Funcionalidade em desenvolvimento - Machine Learning em breve!")
+
+    metadados = artefato_atual()
+    if metadados is None:
+        st.warning("Nenhum modelo treinado. Execute `python modelos.py treinar` no servidor.")
+        return
+    if not metadados['atualizado']:
+        st.warning("O modelo foi treinado com uma versão anterior dos dados. Execute o treino novamente.")
+
+    modelo, previsoes = _modelo_retencao(metadados['versao_dados'], metadados['treinado_em'])
+    metricas = metadados['metricas']
+
+    st.markdown("**Probabilidade de continuar no programa em 2024 a partir do perfil demográfico**")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("AUC (teste)", f"{metricas['auc']:.3f}")
+    col2.metric("Taxa de continuidade", f"{metricas['taxa_continuidade']:.1%}")
+    col3.metric("Usuários no treino", f"{metricas['usuarios_treino']:,}".replace(',', '.'))
+
+    dimensao = st.selectbox("Comparar por:", VARIAVEIS, format_func=lambda v: TRADUCOES.get(v, v))
+    # Previsões já calculadas em lote para cada combinação: aqui só a média ponderada
+    por_grupo = previsoes.groupby(dimensao).apply(
+        lambda g: np.average(g['prob_continuidade'], weights=g['contagem']), include_groups=False)
+    por_grupo = traduzir_colunas(por_grupo.rename('prob_continuidade').reset_index())
+    por_grupo = por_grupo.sort_values('prob_continuidade', ascending=False)
+    fig = grafico_barras(por_grupo, TRADUCOES.get(dimensao, dimensao), 'prob_continuidade',
+                         titulo="Continuidade prevista por grupo")
+    exibir_grafico(fig)
+
+    with st.expander("Simular um perfil"):
+        perfil = {v: st.selectbox(TRADUCOES.get(v, v), sorted(previsoes[v].unique()), key=f'perfil_{v}')
+                  for v in VARIAVEIS}
+        probabilidade = modelo.predict_proba(pd.DataFrame([perfil]))[0, 1]
+        st.metric("Probabilidade prevista de continuidade", f"{probabilidade:.1%}")
+
+    with st.expander("Pesos do modelo"):
+        st.dataframe(coeficientes(modelo), hide_index=True)
+
+def mostrar_indicadores():
+    try:
+        df_indicadores = carregar_indicadores_tidy()
+    except FileNotFoundError:
+        st.error("Planilha de indicadores não encontrada na pasta 'data'")
+        return
+    analise_indicadores_hiv(df_indicadores)
 
 def analise_indicadores_hiv(df_indicadores):
     st.header("📈 Indicadores Nacionais de AIDS")
-    st.warning("Análise de indicadores de HIV em desenvolvimento!")
+    if df_indicadores is None or df_indicadores.empty:
+        st.warning("Nenhum indicador encontrado na planilha.")
+        return
+
+    planilhas = list(df_indicadores['planilha'].cat.categories)
+    planilha = st.selectbox("Tabela:", planilhas)
+    df_planilha = df_indicadores[df_indicadores['planilha'] == planilha]
+
+    nomes = list(dict.fromkeys(df_planilha['indicador'].astype(str)))
+    escolhidos = st.multiselect("Indicadores:", nomes, default=nomes[:5])
+    if not escolhidos:
+        st.info("Selecione ao menos um indicador.")
+        return
+
+    df_escolhidos = df_planilha[df_planilha['indicador'].isin(escolhidos)].copy()
+    df_escolhidos['indicador'] = df_escolhidos['indicador'].astype(str)
+    df_escolhidos = df_escolhidos.sort_values('ano')
+    fig = grafico_linha(df_escolhidos, 'ano', 'valor', titulo=planilha, color='indicador', markers=True)
+    exibir_grafico(fig)
+
+    st.dataframe(df_escolhidos.pivot_table(index='indicador', columns='ano', values='valor', aggfunc='first'))
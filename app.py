@@ -1,6 +1,6 @@
 # app.py
 import streamlit as st
-from database import criar_tabela_respostas
+from database import preparar_banco
 from ui_pages import mostrar_pesquisa, mostrar_analise_pesquisa, mostrar_duvidas_frequentes, mostrar_onde_encontrar, mostrar_admin_backups
 from analysis import mostrar_dados_oficiais
 from analise_comparativa.Comparativa import mostrar_pagina_comparativa
@@ -25,6 +25,9 @@ def mostrar_termo_consentimento():
             st.stop()
 
 def main():
+    # Migrações e carga inicial: só na primeira execução do processo, antes do primeiro envio
+    preparar_banco()
+
     if 'termo_aceito' not in st.session_state:
         st.session_state.termo_aceito = False
 
@@ -51,8 +54,6 @@ def main():
         "🔧 Admin Backups"
     ])
 
-    criar_tabela_respostas()
-
     if menu == "🤖 Análise da Pesquisa":
         mostrar_analise_pesquisa()
     elif menu == "📊 Dados Oficiais":
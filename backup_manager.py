@@ -1,30 +1,215 @@
 # backup_manager.py
-import sqlite3
 import pandas as pd
 import os
-import shutil
+import sqlite3
 from datetime import datetime
 import json
+import shutil
+import tempfile
+import atexit
+import threading
+import time
+from conexao import BANCO_PATH, conexao
+from dados_publicos import gravacao_atomica
+from diario_respostas import diario_travado, marcar_repassado
+from esquema import aplicar_migracoes, garantir_esquema
+
+# Páginas copiadas por passo da API de backup do SQLite; entre os passos o
+# banco fica livre para os escritores (256 páginas de 4 KB = 1 MB por passo)
+PAGINAS_POR_PASSO = 256
+
+# Exportação incremental: os segmentos são compactados num snapshot quando passam deste número
+MAX_SEGMENTOS = int(os.environ.get('PREP_EXPORTACAO_MAX_SEGMENTOS', 20))
+FORMATOS_INCREMENTAIS = ('csv', 'jsonl')
+
+# Retenção dos backups: nas últimas RETENCAO_HORAS horas, o mais recente de cada hora;
+# até RETENCAO_DIAS dias, o mais recente de cada dia; os mais antigos são apagados
+RETENCAO_HORAS = int(os.environ.get('PREP_BACKUP_RETENCAO_HORAS', 24))
+RETENCAO_DIAS = int(os.environ.get('PREP_BACKUP_RETENCAO_DIAS', 30))
+
+# Serializa as exportações incrementais do processo (agendador e página de administração)
+_trava_exportacao = threading.Lock()
+
+def _carimbo():
+    # Microssegundos no nome: backups manual e agendado no mesmo segundo não se sobrescrevem
+    return datetime.now().strftime("%Y%m%d_%H%M%S_%f")
 
 class BackupManager:
-    def __init__(self, db_path='pesquisa_prep.db'):
+    def __init__(self, db_path=BANCO_PATH):
         self.db_path = db_path
         self.backup_dir = 'backups'
         self.csv_backup_dir = 'csv_backups'
+        self.incremental_dir = os.path.join(self.csv_backup_dir, 'incremental')
+        self.catalogo_path = os.path.join(self.backup_dir, 'catalogo.db')
         
         # Criar diretórios de backup se não existirem
         os.makedirs(self.backup_dir, exist_ok=True)
         os.makedirs(self.csv_backup_dir, exist_ok=True)
+        os.makedirs(self.incremental_dir, exist_ok=True)
+        self._preparar_catalogo()
+    
+    # Catálogo dos backups: uma tabela indexada por tipo e data no lugar de listar
+    # os diretórios, para que listar e podar continue barato com muitos arquivos.
+    # Cada migração leva o catálogo de uma versão (PRAGMA user_version) à seguinte
+    def _preparar_catalogo(self):
+        migracoes = [self._catalogo_v1, self._catalogo_v2]
+        with conexao(self.catalogo_path) as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= len(migracoes):
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            versao = conn.execute("PRAGMA user_version").fetchone()[0]
+            for numero, migracao in enumerate(migracoes[versao:], start=versao + 1):
+                migracao(conn)
+                conn.execute(f"PRAGMA user_version = {numero}")
+    
+    def _catalogo_v1(self, conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS backups (
+                arquivo TEXT PRIMARY KEY,
+                tipo TEXT NOT NULL,
+                criado_em REAL NOT NULL,
+                impressao TEXT,
+                tamanho INTEGER
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_backups_tipo_criado ON backups (tipo, criado_em)")
+        # Primeira execução: cataloga os backups que já estão no disco
+        existentes = []
+        for diretorio, tipos in ((self.backup_dir, ('db',)), (self.csv_backup_dir, ('csv', 'json'))):
+            for entrada in os.scandir(diretorio):
+                tipo = entrada.name.rsplit('.', 1)[-1]
+                if entrada.is_file() and tipo in tipos and entrada.path != self.catalogo_path:
+                    info = entrada.stat()
+                    existentes.append((entrada.name, tipo, info.st_mtime, None, info.st_size))
+        conn.executemany("INSERT OR IGNORE INTO backups VALUES (?, ?, ?, ?, ?)", existentes)
+    
+    def _catalogo_v2(self, conn):
+        # Log dos backups: só recebe inserções, cada uma na sua transação
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS log_backups (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                dados TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_log_backups_timestamp ON log_backups (timestamp)")
+        # Traz o histórico do antigo backup_log.json (o arquivo fica intacto; a migração roda uma só vez)
+        log_antigo = os.path.join(self.backup_dir, 'backup_log.json')
+        try:
+            with open(log_antigo, 'r') as f:
+                logs = json.load(f)
+        except FileNotFoundError:
+            return
+        except json.JSONDecodeError as e:
+            print(f"backup_log.json ilegível, histórico antigo não migrado: {e}")
+            return
+        conn.executemany("INSERT INTO log_backups (timestamp, dados) VALUES (?, ?)",
+                         [(log.get('timestamp', ''), json.dumps(log)) for log in logs])
+    
+    def _caminho_backup(self, arquivo, tipo):
+        return os.path.join(self.backup_dir if tipo == 'db' else self.csv_backup_dir, arquivo)
+    
+    def _catalogar(self, caminho, tipo, impressao=None):
+        with conexao(self.catalogo_path) as conn:
+            conn.execute("INSERT OR REPLACE INTO backups VALUES (?, ?, ?, ?, ?)",
+                         (os.path.basename(caminho), tipo, time.time(), impressao, os.path.getsize(caminho)))
     
-    def criar_backup_db(self):
-        """Cria backup do banco SQLite com timestamp"""
+    def ultimo_backup(self, tipo='db'):
+        """Caminho e impressão do backup mais recente do tipo, ou (None, None)"""
+        with conexao(self.catalogo_path) as conn:
+            linha = conn.execute("SELECT arquivo, impressao FROM backups WHERE tipo = ? "
+                                 "ORDER BY criado_em DESC LIMIT 1", (tipo,)).fetchone()
+        if linha is None:
+            return None, None
+        return self._caminho_backup(linha[0], tipo), linha[1]
+    
+    def aplicar_retencao(self, agora=None):
+        """Apaga os backups fora da política de retenção; o mais recente de cada tipo é sempre mantido"""
+        agora = agora or time.time()
+        with conexao(self.catalogo_path) as conn:
+            remover = conn.execute("""
+                WITH faixas AS (
+                    SELECT arquivo, tipo, criado_em,
+                           CASE WHEN criado_em >= :agora - :horas * 3600
+                                    THEN strftime('%Y-%m-%d %H', criado_em, 'unixepoch', 'localtime')
+                                WHEN criado_em >= :agora - :dias * 86400
+                                    THEN date(criado_em, 'unixepoch', 'localtime')
+                           END AS faixa
+                    FROM backups
+                )
+                SELECT arquivo, tipo FROM (
+                    SELECT arquivo, tipo, faixa,
+                           ROW_NUMBER() OVER (PARTITION BY tipo, faixa ORDER BY criado_em DESC) AS na_faixa,
+                           ROW_NUMBER() OVER (PARTITION BY tipo ORDER BY criado_em DESC) AS recencia
+                    FROM faixas
+                )
+                WHERE recencia > 1 AND (faixa IS NULL OR na_faixa > 1)
+            """, {'agora': agora, 'horas': RETENCAO_HORAS, 'dias': RETENCAO_DIAS}).fetchall()
+            for arquivo, tipo in remover:
+                try:
+                    os.remove(self._caminho_backup(arquivo, tipo))
+                except FileNotFoundError:
+                    pass
+            conn.executemany("DELETE FROM backups WHERE arquivo = ?", [(arquivo,) for arquivo, _ in remover])
+        return [arquivo for arquivo, _ in remover]
+    
+    @staticmethod
+    def _copiar_paginas(origem, destino, progresso=None):
+        # progresso(fração) é chamado após cada passo
+        def informar(status, restantes, total):
+            if progresso and total:
+                progresso(1 - restantes / total)
+        origem.backup(destino, pages=PAGINAS_POR_PASSO, progress=informar)
+    
+    @staticmethod
+    def _impressao(conn):
+        # As respostas só são inseridas (ou o banco inteiro restaurado): o maior rowid
+        # de cada tabela, o total de respostas e a versão do esquema mudam a cada alteração.
+        # PRAGMA data_version não serve aqui: ignora commits feitos pela própria conexão do pool
+        partes = [str(conn.execute("PRAGMA schema_version").fetchone()[0])]
+        tabelas = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                               "AND name NOT LIKE 'sqlite_%' ORDER BY name").fetchall()
+        for (tabela,) in tabelas:
+            maximo = conn.execute(f'SELECT MAX(rowid) FROM "{tabela}"').fetchone()[0]
+            partes.append(f"{tabela}={maximo}")
+        if ('respostas',) in tabelas:
+            partes.append(str(conn.execute("SELECT COUNT(*) FROM respostas").fetchone()[0]))
+        return ':'.join(partes)
+    
+    def criar_backup_db(self, progresso=None, forcar=False):
+        """Cria backup consistente do banco SQLite com timestamp, pela API de backup online.
+        
+        Se o banco não mudou desde o último backup, nada é copiado e o caminho
+        do último backup é devolvido (a menos de 'forcar').
+        """
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_filename = f"pesquisa_prep_backup_{timestamp}.db"
+            backup_filename = f"pesquisa_prep_backup_{_carimbo()}.db"
             backup_path = os.path.join(self.backup_dir, backup_filename)
             
             if os.path.exists(self.db_path):
-                shutil.copy2(self.db_path, backup_path)
+                ultimo_path, ultima_impressao = self.ultimo_backup('db')
+                with conexao(self.db_path) as origem:
+                    # Uma transação de leitura aberta fixa o snapshot do WAL durante toda a cópia:
+                    # sem ela, cada resposta gravada por outra conexão reiniciaria a cópia do zero.
+                    # Os escritores continuam gravando no WAL sem esperar pelo backup
+                    origem.execute("BEGIN")
+                    try:
+                        impressao = self._impressao(origem)
+                        if not forcar and impressao == ultima_impressao and os.path.exists(ultimo_path):
+                            return ultimo_path
+                        # Temporário exclusivo: um backup manual e um agendado simultâneos não o compartilham
+                        with gravacao_atomica(backup_path) as tmp_path:
+                            destino = sqlite3.connect(tmp_path)
+                            try:
+                                self._copiar_paginas(origem, destino, progresso)
+                                # O backup é um arquivo único, sem -wal
+                                destino.execute("PRAGMA journal_mode=DELETE")
+                            finally:
+                                destino.close()
+                    finally:
+                        origem.rollback()
+                self._catalogar(backup_path, 'db', impressao)
+                self.aplicar_retencao()
                 return backup_path
             return None
         except Exception as e:
@@ -34,15 +219,16 @@ class BackupManager:
     def exportar_csv(self):
         """Exporta dados para CSV como backup adicional"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            df = pd.read_sql("SELECT * FROM respostas", conn)
-            conn.close()
+            with conexao(self.db_path) as conn:
+                df = pd.read_sql("SELECT * FROM respostas", conn)
             
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            csv_filename = f"respostas_backup_{timestamp}.csv"
+            csv_filename = f"respostas_backup_{_carimbo()}.csv"
             csv_path = os.path.join(self.csv_backup_dir, csv_filename)
             
-            df.to_csv(csv_path, index=False, encoding='utf-8')
+            with gravacao_atomica(csv_path) as tmp_path:
+                df.to_csv(tmp_path, index=False, encoding='utf-8')
+            self._catalogar(csv_path, 'csv')
+            self.aplicar_retencao()
             return csv_path
         except Exception as e:
             print(f"Erro ao exportar CSV: {e}")
@@ -51,88 +237,415 @@ class BackupManager:
     def exportar_json(self):
         """Exporta dados para JSON como backup adicional"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            df = pd.read_sql("SELECT * FROM respostas", conn)
-            conn.close()
+            with conexao(self.db_path) as conn:
+                df = pd.read_sql("SELECT * FROM respostas", conn)
             
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            json_filename = f"respostas_backup_{timestamp}.json"
+            json_filename = f"respostas_backup_{_carimbo()}.json"
             json_path = os.path.join(self.csv_backup_dir, json_filename)
             
             # Converter DataFrame para JSON
-            df.to_json(json_path, orient='records', date_format='iso', indent=2)
+            with gravacao_atomica(json_path) as tmp_path:
+                df.to_json(tmp_path, orient='records', date_format='iso', indent=2)
+            self._catalogar(json_path, 'json')
+            self.aplicar_retencao()
             return json_path
         except Exception as e:
             print(f"Erro ao exportar JSON: {e}")
             return None
     
-    def backup_completo(self):
-        """Realiza backup completo em múltiplos formatos"""
-        resultados = {
-            'db_backup': self.criar_backup_db(),
-            'csv_backup': self.exportar_csv(),
-            'json_backup': self.exportar_json(),
-            'timestamp': datetime.now().isoformat()
-        }
+    # Exportação incremental. O estado guarda a marca d'água (maior id exportado),
+    # o snapshot atual e os segmentos posteriores a ele; snapshot + segmentos
+    # reconstroem a exportação em qualquer id
+    def _caminho_estado(self):
+        return os.path.join(self.incremental_dir, 'estado.json')
+    
+    def ler_estado_exportacao(self):
+        try:
+            with open(self._caminho_estado(), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {'ultimo_id': 0, 'snapshot': None, 'segmentos': []}
+    
+    def _gravar_estado_exportacao(self, estado):
+        with gravacao_atomica(self._caminho_estado()) as tmp_path:
+            with open(tmp_path, 'w') as f:
+                json.dump(estado, f, indent=2)
+    
+    def _reiniciar_exportacao(self, estado):
+        # Chamada com _trava_exportacao adquirida: descarta a cadeia atual de arquivos
+        for parte in ([estado['snapshot']] if estado['snapshot'] else []) + estado['segmentos']:
+            for arquivo in parte['arquivos'].values():
+                caminho = os.path.join(self.incremental_dir, arquivo)
+                if os.path.exists(caminho):
+                    os.remove(caminho)
+        estado = {'ultimo_id': 0, 'snapshot': None, 'segmentos': []}
+        self._gravar_estado_exportacao(estado)
+        return estado
+    
+    def _gravar_arquivos(self, df, prefixo):
+        caminhos = {}
+        for formato in FORMATOS_INCREMENTAIS:
+            caminho = os.path.join(self.incremental_dir, f"{prefixo}.{formato}")
+            if formato == 'csv':
+                df.to_csv(caminho, index=False, encoding='utf-8')
+            else:
+                df.to_json(caminho, orient='records', date_format='iso', lines=True, force_ascii=False)
+            caminhos[formato] = os.path.basename(caminho)
+        return caminhos
+    
+    def exportar_incremental(self):
+        """Exporta apenas as respostas com id acima da marca d'água, como um novo segmento"""
+        try:
+            with _trava_exportacao:
+                estado = self.ler_estado_exportacao()
+                with conexao(self.db_path) as conn:
+                    maximo = conn.execute("SELECT COALESCE(MAX(id), 0) FROM respostas").fetchone()[0]
+                    if maximo < estado['ultimo_id']:
+                        # O banco voltou para trás (restauração): recomeça a cadeia do zero
+                        print("Banco com menos respostas que a última exportação; recomeçando a exportação incremental")
+                        estado = self._reiniciar_exportacao(estado)
+                    df = pd.read_sql("SELECT * FROM respostas WHERE id > ? ORDER BY id", conn,
+                                     params=(estado['ultimo_id'],))
+                if df.empty:
+                    return None
+                
+                de_id, ate_id = int(df['id'].iloc[0]), int(df['id'].iloc[-1])
+                segmento = {
+                    'de_id': de_id,
+                    'ate_id': ate_id,
+                    'linhas': len(df),
+                    'timestamp': datetime.now().isoformat(),
+                    'arquivos': self._gravar_arquivos(df, f"segmento_{de_id:09d}_{ate_id:09d}"),
+                }
+                estado['segmentos'].append(segmento)
+                estado['ultimo_id'] = ate_id
+                self._gravar_estado_exportacao(estado)
+                
+                if len(estado['segmentos']) >= MAX_SEGMENTOS:
+                    self._compactar(estado)
+                return segmento
+        except Exception as e:
+            print(f"Erro na exportação incremental: {e}")
+            return None
+    
+    def _ler_exportacao(self, arquivo):
+        # Tudo como texto: '018' continua '018' e 3 não vira 3.0
+        caminho = os.path.join(self.incremental_dir, arquivo)
+        if arquivo.endswith('.csv'):
+            return pd.read_csv(caminho, dtype=str, keep_default_na=False)
+        return pd.read_json(caminho, orient='records', lines=True, dtype=False, convert_dates=False)
+    
+    def _concatenar_arquivos(self, arquivos, destino):
+        """Junta os arquivos byte a byte, sem reinterpretar os valores.
         
-        # Salvar log do backup
-        log_path = os.path.join(self.backup_dir, 'backup_log.json')
-        logs = []
+        No CSV o cabeçalho só é copiado do primeiro arquivo; se os cabeçalhos
+        diferem (coluna nova no banco), as partes são alinhadas pelo pandas, como texto.
+        """
+        caminhos = [os.path.join(self.incremental_dir, a) for a in arquivos]
+        csv = destino.endswith('.csv')
+        if csv:
+            cabecalhos = set()
+            for caminho in caminhos:
+                with open(caminho, 'rb') as f:
+                    cabecalhos.add(f.readline())
         
-        if os.path.exists(log_path):
-            with open(log_path, 'r') as f:
-                logs = json.load(f)
+        with gravacao_atomica(destino) as tmp_path:
+            if csv and len(cabecalhos) > 1:
+                df = pd.concat([self._ler_exportacao(a) for a in arquivos], ignore_index=True)
+                df.to_csv(tmp_path, index=False, encoding='utf-8')
+            else:
+                with open(tmp_path, 'wb') as saida:
+                    for i, caminho in enumerate(caminhos):
+                        with open(caminho, 'rb') as f:
+                            if csv and i > 0:
+                                f.readline()
+                            shutil.copyfileobj(f, saida)
+    
+    def _partes(self, estado, formato, ate_id=None):
+        """Snapshot e segmentos necessários para chegar a 'ate_id' (todos se None)"""
+        partes = []
+        if estado['snapshot']:
+            partes.append(estado['snapshot']['arquivos'][formato])
+        for segmento in estado['segmentos']:
+            if ate_id is not None and segmento['de_id'] > ate_id:
+                break
+            partes.append(segmento['arquivos'][formato])
+        return partes
+    
+    def _compactar(self, estado):
+        if not estado['segmentos']:
+            return estado['snapshot']
+        ate_id = estado['ultimo_id']
+        arquivos = {}
+        for formato in FORMATOS_INCREMENTAIS:
+            arquivo = f"snapshot_{ate_id:09d}.{formato}"
+            self._concatenar_arquivos(self._partes(estado, formato), os.path.join(self.incremental_dir, arquivo))
+            arquivos[formato] = arquivo
         
-        logs.append(resultados)
+        antigos = [estado['snapshot']] if estado['snapshot'] else []
+        antigos += estado['segmentos']
+        estado['snapshot'] = {'ate_id': ate_id, 'timestamp': datetime.now().isoformat(), 'arquivos': arquivos}
+        estado['segmentos'] = []
+        # O estado novo é gravado antes de apagar os arquivos antigos
+        self._gravar_estado_exportacao(estado)
+        for parte in antigos:
+            for arquivo in parte['arquivos'].values():
+                if arquivo not in arquivos.values():
+                    os.remove(os.path.join(self.incremental_dir, arquivo))
+        return estado['snapshot']
+    
+    def compactar_exportacoes(self):
+        """Junta o snapshot e os segmentos num novo snapshot completo"""
+        with _trava_exportacao:
+            return self._compactar(self.ler_estado_exportacao())
+    
+    def reconstruir_exportacao(self, ate_id=None, formato='csv'):
+        """Exportação como era quando a resposta 'ate_id' foi gravada (a atual se None).
         
-        with open(log_path, 'w') as f:
-            json.dump(logs, f, indent=2)
+        Os ids só crescem, então o snapshot filtrado por id reproduz qualquer ponto anterior a ele.
+        """
+        with _trava_exportacao:
+            estado = self.ler_estado_exportacao()
+            partes = self._partes(estado, formato, ate_id)
+        if not partes:
+            return pd.DataFrame()
+        df = pd.concat([self._ler_exportacao(a) for a in partes], ignore_index=True)
+        if ate_id is not None:
+            df = df[df['id'].astype(int) <= ate_id].reset_index(drop=True)
+        return df
+    
+    def backup_completo(self, progresso=None):
+        """Realiza backup do banco e exportação incremental das respostas novas"""
+        segmento = self.exportar_incremental()
+        ultimo_path, _ = self.ultimo_backup('db')
+        db_backup = self.criar_backup_db(progresso)
+        resultados = {
+            'db_backup': db_backup,
+            # Banco sem alterações desde o último backup: nenhuma cópia nova
+            'db_inalterado': db_backup is not None and db_backup == ultimo_path,
+            'csv_backup': segmento and os.path.join(self.incremental_dir, segmento['arquivos']['csv']),
+            'json_backup': segmento and os.path.join(self.incremental_dir, segmento['arquivos']['jsonl']),
+            'timestamp': datetime.now().isoformat()
+        }
         
+        self.registrar_log(resultados)
         return resultados
     
+    def registrar_log(self, resultados):
+        """Acrescenta uma entrada ao log de backups"""
+        with conexao(self.catalogo_path) as conn:
+            conn.execute("INSERT INTO log_backups (timestamp, dados) VALUES (?, ?)",
+                         (resultados['timestamp'], json.dumps(resultados)))
+    
+    def ultimos_logs(self, quantidade=5):
+        """Últimas entradas do log, da mais recente para a mais antiga"""
+        with conexao(self.catalogo_path) as conn:
+            linhas = conn.execute("SELECT dados FROM log_backups ORDER BY id DESC LIMIT ?", (quantidade,)).fetchall()
+        return [json.loads(dados) for (dados,) in linhas]
+    
+    def logs_entre(self, inicio=None, fim=None):
+        """Entradas do log com timestamp ISO em [inicio, fim], em ordem cronológica"""
+        with conexao(self.catalogo_path) as conn:
+            linhas = conn.execute(
+                "SELECT dados FROM log_backups WHERE timestamp >= ? AND timestamp <= ? ORDER BY timestamp, id",
+                (inicio or '', fim or '\uffff')).fetchall()
+        return [json.loads(dados) for (dados,) in linhas]
+    
     def contar_respostas(self):
         """Conta o número atual de respostas"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM respostas")
-            count = cursor.fetchone()[0]
-            conn.close()
-            return count
+            with conexao(self.db_path) as conn:
+                return conn.execute("SELECT COUNT(*) FROM respostas").fetchone()[0]
         except Exception as e:
             print(f"Erro ao contar respostas: {e}")
             return 0
     
     def listar_backups(self):
-        """Lista todos os backups disponíveis"""
+        """Lista os backups disponíveis, do mais recente para o mais antigo"""
         backups = {
             'db_backups': [],
             'csv_backups': []
         }
         
-        if os.path.exists(self.backup_dir):
-            for file in os.listdir(self.backup_dir):
-                if file.endswith('.db'):
-                    backups['db_backups'].append(file)
+        with conexao(self.catalogo_path) as conn:
+            for arquivo, tipo in conn.execute("SELECT arquivo, tipo FROM backups ORDER BY criado_em DESC"):
+                backups['db_backups' if tipo == 'db' else 'csv_backups'].append(arquivo)
         
-        if os.path.exists(self.csv_backup_dir):
-            for file in os.listdir(self.csv_backup_dir):
-                if file.endswith('.csv') or file.endswith('.json'):
-                    backups['csv_backups'].append(file)
+        estado = self.ler_estado_exportacao()
+        backups['exportacao_incremental'] = self._partes(estado, 'csv') + self._partes(estado, 'jsonl')
         
         return backups
     
-    def restaurar_backup(self, backup_path):
-        """Restaura backup do banco de dados"""
+    @staticmethod
+    def validar_backup(backup_path):
+        """Verifica a integridade do arquivo de backup sem alterá-lo"""
         try:
-            if os.path.exists(backup_path):
-                shutil.copy2(backup_path, self.db_path)
-                return True
+            conn = sqlite3.connect(f"file:{backup_path}?mode=ro", uri=True)
+            try:
+                if conn.execute("PRAGMA quick_check").fetchone()[0] != 'ok':
+                    return False
+                return conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'respostas'"
+                ).fetchone() is not None
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Backup inválido {backup_path}: {e}")
             return False
+    
+    def restaurar_backup(self, backup_path, progresso=None):
+        """Restaura backup do banco de dados.
+        
+        As páginas são copiadas para o banco em uso numa única transação: as
+        conexões abertas continuam válidas e passam a ver o banco restaurado
+        de uma vez, sem reiniciar o servidor.
+        """
+        try:
+            if not os.path.exists(backup_path) or not self.validar_backup(backup_path):
+                return False
+            # A trava impede uma exportação incremental entre a restauração e o reinício da cadeia.
+            # O diário fica travado até o fim: nenhum envio novo entra entre a cópia e o checkpoint
+            with _trava_exportacao, diario_travado() as diario:
+                fd, tmp_path = tempfile.mkstemp(dir=self.backup_dir, suffix='.restaurar.tmp')
+                os.close(fd)
+                try:
+                    shutil.copyfile(backup_path, tmp_path)
+                    origem = sqlite3.connect(tmp_path)
+                    try:
+                        # O backup traz o checkpoint do diário da época dele: repassar dali em diante
+                        # traria de volta as respostas que a restauração substitui. A cópia restaurada
+                        # já chega com o diário inteiro marcado como repassado
+                        aplicar_migracoes(origem)
+                        marcar_repassado(origem, diario)
+                        origem.commit()
+                        with conexao(self.db_path) as destino:
+                            self._copiar_paginas(origem, destino, progresso)
+                    finally:
+                        origem.close()
+                finally:
+                    os.remove(tmp_path)
+                garantir_esquema(self.db_path, forcar=True)
+                # O banco restaurado traz o sqlite_sequence antigo: os ids seguintes serão
+                # reaproveitados, então a cadeia de exportação recomeça do zero
+                self._reiniciar_exportacao(self.ler_estado_exportacao())
+            return True
         except Exception as e:
             print(f"Erro ao restaurar backup: {e}")
             return False
 
+# Backups em segundo plano: no máximo um a cada INTERVALO segundos, ou antes
+# se MAX_RESPOSTAS novas respostas se acumularem
+INTERVALO_BACKUP_S = float(os.environ.get('PREP_BACKUP_INTERVALO_S', 300))
+MAX_RESPOSTAS_SEM_BACKUP = int(os.environ.get('PREP_BACKUP_MAX_RESPOSTAS', 50))
+
+class AgendadorBackup:
+    """Agrupa as respostas recebidas e faz o backup completo numa thread separada.
+
+    O envio do formulário só chama notificar(), que não faz E/S; rajadas de
+    respostas viram um único backup.
+    """
+    def __init__(self, intervalo=INTERVALO_BACKUP_S, max_respostas=MAX_RESPOSTAS_SEM_BACKUP, backup_manager=None):
+        self.intervalo = intervalo
+        self.max_respostas = max_respostas
+        self.backup_manager = backup_manager or BackupManager()
+        self._trava = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = False
+        self.pendentes = 0
+        self.primeira_pendente = None
+        self.ultimo_backup = None
+        self.ultimo_resultado = None
+        self.ultimo_erro = None
+        self.em_execucao = False
+        self._thread = threading.Thread(target=self._executar, name='agendador-backup', daemon=True)
+        self._thread.start()
+        atexit.register(self.parar)
+
+    def notificar(self, novas=1):
+        """Registra respostas novas ainda sem backup"""
+        with self._trava:
+            if self.pendentes == 0:
+                self.primeira_pendente = time.time()
+            self.pendentes += novas
+            if self.pendentes >= self.max_respostas:
+                self._acordar.set()
+
+    def _vencido(self):
+        if self.pendentes == 0:
+            return False
+        if self.pendentes >= self.max_respostas:
+            return True
+        referencia = self.ultimo_backup or self.primeira_pendente
+        return time.time() - referencia >= self.intervalo
+
+    def _executar(self):
+        while not self._parar:
+            self._acordar.wait(timeout=min(self.intervalo, 5))
+            self._acordar.clear()
+            with self._trava:
+                vencido = self._vencido()
+            if vencido:
+                self._fazer_backup()
+
+    def _fazer_backup(self):
+        with self._trava:
+            # As respostas que chegarem durante o backup ficam para o próximo
+            incluidas = self.pendentes
+            self.em_execucao = True
+        try:
+            resultado = self.backup_manager.backup_completo()
+            # backup_completo não levanta exceções: a cópia que falhou volta como None
+            if resultado['db_backup'] is None and os.path.exists(self.backup_manager.db_path):
+                raise RuntimeError("falha ao copiar o banco (detalhes no log do servidor)")
+            self.ultimo_resultado = resultado
+            self.ultimo_erro = None
+        except Exception as e:
+            print(f"Erro no backup em segundo plano: {e}")
+            self.ultimo_erro = str(e)
+            incluidas = 0
+        with self._trava:
+            self.em_execucao = False
+            self.ultimo_backup = time.time()
+            self.pendentes -= incluidas
+            # Após uma falha o atraso continua contando da resposta mais antiga sem backup
+            if not self.pendentes:
+                self.primeira_pendente = None
+            elif incluidas:
+                self.primeira_pendente = time.time()
+
+    def parar(self):
+        """Encerra a thread, fazendo um último backup se houver respostas pendentes"""
+        self._parar = True
+        self._acordar.set()
+        self._thread.join(timeout=5)
+        if self.pendentes:
+            self._fazer_backup()
+
+    def status(self):
+        with self._trava:
+            agora = time.time()
+            return {
+                'pendentes': self.pendentes,
+                'em_execucao': self.em_execucao,
+                'ultimo_backup': datetime.fromtimestamp(self.ultimo_backup).isoformat() if self.ultimo_backup else None,
+                # Há quanto tempo a resposta mais antiga sem backup está esperando
+                'atraso_s': agora - self.primeira_pendente if self.primeira_pendente else 0.0,
+                'intervalo_s': self.intervalo,
+                'max_respostas': self.max_respostas,
+                'ultimo_erro': self.ultimo_erro,
+            }
+
+_agendador = None
+_trava_agendador = threading.Lock()
+
+def obter_agendador():
+    """Agendador único do processo, criado no primeiro uso"""
+    global _agendador
+    with _trava_agendador:
+        if _agendador is None:
+            _agendador = AgendadorBackup()
+        return _agendador
+
 def backup_automatico():
     """Função para ser chamada automaticamente"""
     backup_manager = BackupManager()
@@ -0,0 +1,74 @@
+# benchmark_leitura.py
+# Compara os motores de leitura dos CSVs oficiais: tempo, pico de memória (RSS) e linhas/s
+#
+# Uso: python benchmark_leitura.py [--datasets usuarios dispensas] [--motores pandas pyarrow] [--repeticoes 3]
+# Cada medição roda em um subprocesso novo, para que o pico de RSS de um motor não contamine o próximo.
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from dados_publicos import ARQUIVOS_PUBLICOS, MOTORES_CSV
+
+def _medir(nome, motor, paralelo):
+    """Executada no subprocesso: lê o dataset uma vez e imprime as medições em JSON"""
+    import dados_publicos
+    rss_inicial = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    inicio = time.perf_counter()
+    if paralelo:
+        df = dados_publicos.carregar_paralelo(nome)
+    else:
+        fontes = dados_publicos._garantir_fontes(nome)
+        # Mesmo critério do carregamento paralelo: arquivo completo x partes
+        deduplicador = dados_publicos._Deduplicador()
+        partes = [deduplicador.filtrar(int(fonte.name != ARQUIVOS_PUBLICOS[nome]),
+                                       dados_publicos._ler_csv(fonte, nome, motor)) for fonte in fontes]
+        df = dados_publicos._concatenar(partes)
+    segundos = time.perf_counter() - inicio
+    print(json.dumps({
+        'linhas': len(df),
+        'segundos': segundos,
+        # ru_maxrss vem em KB no Linux
+        'rss_pico_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'rss_inicial_mb': rss_inicial / 1024,
+        # No modo paralelo, maior pico entre os processos de trabalho já encerrados
+        'rss_pico_trabalhadores_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }))
+
+def executar(nome, motor, paralelo=False):
+    comando = [sys.executable, __file__, '--medir', nome, motor]
+    if paralelo:
+        comando.append('--paralelo')
+    # Os processos de trabalho do modo paralelo usam o motor pela variável de ambiente
+    saida = subprocess.run(comando, capture_output=True, text=True, check=True,
+                           env={**os.environ, 'PREP_MOTOR_CSV': motor})
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos motores de leitura dos CSVs oficiais")
+    parser.add_argument('--datasets', nargs='+', default=list(ARQUIVOS_PUBLICOS), choices=list(ARQUIVOS_PUBLICOS))
+    parser.add_argument('--motores', nargs='+', default=list(MOTORES_CSV), choices=list(MOTORES_CSV))
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--paralelo', action='store_true', help="mede também a leitura paralela por faixas de bytes")
+    args = parser.parse_args()
+
+    print(f"{'dataset':<10} {'motor':<16} {'modo':<9} {'linhas':>10} {'tempo (s)':>10} "
+          f"{'RSS pico (MB)':>14} {'linhas/s':>12}")
+    for nome in args.datasets:
+        for motor in args.motores:
+            for paralelo in ([False, True] if args.paralelo else [False]):
+                medicoes = [executar(nome, motor, paralelo) for _ in range(args.repeticoes)]
+                # Melhor tempo entre as repetições: descarta interferência do cache de disco frio
+                melhor = min(medicoes, key=lambda m: m['segundos'])
+                rss = max(max(m['rss_pico_mb'], m['rss_pico_trabalhadores_mb']) for m in medicoes)
+                modo = 'paralelo' if paralelo else 'simples'
+                print(f"{nome:<10} {motor:<16} {modo:<9} {melhor['linhas']:>10} {melhor['segundos']:>10.2f} "
+                      f"{rss:>14.0f} {melhor['linhas'] / melhor['segundos']:>12,.0f}")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--medir':
+        _medir(sys.argv[2], sys.argv[3], '--paralelo' in sys.argv)
+    else:
+        main()
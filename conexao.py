@@ -0,0 +1,67 @@
+# conexao.py
+# Pool de conexões SQLite por processo, em modo WAL, compartilhado por todos os acessos ao banco da pesquisa
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+BANCO_PATH = 'pesquisa_prep.db'
+
+# Tempo máximo (ms) que uma escrita espera pela trava antes de falhar com "database is locked"
+BUSY_TIMEOUT_MS = int(os.environ.get('PREP_SQLITE_BUSY_TIMEOUT_MS', 5000))
+# Conexões ociosas mantidas por banco; as excedentes são fechadas ao serem devolvidas
+MAX_CONEXOES_OCIOSAS = int(os.environ.get('PREP_SQLITE_CONEXOES', 8))
+# Instruções preparadas reaproveitadas por conexão (o cache é por conexão, daí o pool)
+INSTRUCOES_EM_CACHE = 256
+
+# WAL: leitores não esperam escritores e vice-versa. Com WAL, synchronous=NORMAL
+# mantém o banco consistente após queda de energia (perde no máximo o último commit)
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': BUSY_TIMEOUT_MS,
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,  # KB (negativo): 16 MB de cache de páginas por conexão
+    'temp_store': 'MEMORY',
+}
+
+_pools = {}
+_trava_pools = threading.Lock()
+
+def _pool(caminho):
+    # A chave inclui o pid: conexões nunca atravessam um fork
+    chave = (os.getpid(), os.path.abspath(caminho))
+    with _trava_pools:
+        if chave not in _pools:
+            _pools[chave] = queue.LifoQueue(maxsize=MAX_CONEXOES_OCIOSAS)
+        return _pools[chave]
+
+def _abrir(caminho):
+    # check_same_thread=False: a conexão pode ser usada por outra thread depois de devolvida,
+    # mas só uma thread a usa de cada vez (enquanto está emprestada)
+    conn = sqlite3.connect(caminho, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                           cached_statements=INSTRUCOES_EM_CACHE)
+    for pragma, valor in PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma}={valor}")
+    return conn
+
+@contextmanager
+def conexao(caminho=BANCO_PATH):
+    """Empresta uma conexão do pool.
+
+    Ao sair do bloco a transação é confirmada (ou desfeita em caso de erro) e a
+    conexão volta ao pool para ser reaproveitada.
+    """
+    pool = _pool(caminho)
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        conn = _abrir(caminho)
+    try:
+        with conn:
+            yield conn
+    finally:
+        try:
+            pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
@@ -0,0 +1,158 @@
+# consultas_publicas.py
+# Banco SQLite local com índices sobre os dados oficiais: filtros e agrupamentos executados no banco
+import os
+import sqlite3
+import pandas as pd
+from dados_publicos import (CACHE_PATH, ESQUEMAS, abrir_tabela_arrow, colunas_esquema, gravacao_atomica,
+                            trava_reconstrucao, versao_dataset)
+
+BANCO_PUBLICO_PATH = CACHE_PATH / 'dados_publicos.db'
+
+# Índices por tabela. Os compostos cobrem o recorte mais comum (período) junto com a
+# coluna agrupada, então a consulta é respondida só pelo índice. Só as dispensas vão
+# para o banco: os recortes de usuários (perfil, Comparativa) saem do cubo (cubo.py),
+# e o banco não é remontado quando apenas o cadastro de usuários muda
+INDICES = {
+    'dispensas': [('dt_disp', 'tp_servico_atendimento'), ('dt_disp', 'tp_profissional')],
+}
+
+# Colunas derivadas disponíveis para agrupamento
+COLUNAS_DERIVADAS = {
+    'mes': "substr(dt_disp, 1, 7)",
+    'ano': "substr(dt_disp, 1, 4)",
+}
+
+def _versoes():
+    return {nome: versao_dataset(nome) for nome in INDICES}
+
+def _ingerir(conn, nome, tamanho_lote=100_000):
+    """Copia o dataset do cache Arrow para o banco em lotes (memória limitada ao lote)"""
+    tabela = abrir_tabela_arrow(nome)
+    colunas = tabela.column_names
+    conn.execute(f"CREATE TABLE {nome} ({', '.join(f'{c} TEXT' for c in colunas)})")
+    insert = f"INSERT INTO {nome} VALUES ({', '.join('?' for _ in colunas)})"
+    datas = set(ESQUEMAS[nome]['datas'])
+    for lote in tabela.to_batches(max_chunksize=tamanho_lote):
+        df = lote.to_pandas()
+        for coluna in colunas:
+            if coluna in datas:
+                # ISO 'AAAA-MM-DD': a ordem do texto é a ordem das datas
+                df[coluna] = df[coluna].dt.strftime('%Y-%m-%d')
+            df[coluna] = df[coluna].astype(object).where(df[coluna].notna(), None)
+        conn.executemany(insert, df.itertuples(index=False, name=None))
+    for indice in INDICES[nome]:
+        if all(coluna in colunas for coluna in indice):
+            conn.execute(f"CREATE INDEX idx_{nome}_{'_'.join(indice)} ON {nome} ({', '.join(indice)})")
+
+def construir_banco_publico():
+    """Monta o banco a partir do cache colunar e troca o arquivo de forma atômica"""
+    versoes = _versoes()
+    # Temporário exclusivo (vazio, que o SQLite trata como banco novo): outra
+    # thread montando o banco ao mesmo tempo não compartilha nem apaga o arquivo
+    with gravacao_atomica(BANCO_PUBLICO_PATH) as tmp_path:
+        conn = sqlite3.connect(tmp_path)
+        try:
+            # Banco derivado e reconstruível: dispensa journal e sync durante a carga
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.execute("CREATE TABLE metadados (chave TEXT PRIMARY KEY, valor TEXT)")
+            for nome in INDICES:
+                _ingerir(conn, nome)
+            conn.executemany("INSERT INTO metadados VALUES (?, ?)", list(versoes.items()))
+            conn.execute("ANALYZE")
+            conn.commit()
+        finally:
+            conn.close()
+    return versoes
+
+def banco_atualizado():
+    """Verifica se o banco corresponde às versões atuais dos datasets"""
+    if not BANCO_PUBLICO_PATH.exists():
+        return False
+    try:
+        conn = _conectar()
+        registradas = dict(conn.execute("SELECT chave, valor FROM metadados").fetchall())
+        conn.close()
+    except sqlite3.Error:
+        return False
+    return registradas == _versoes()
+
+def _conectar():
+    return sqlite3.connect(f"file:{BANCO_PUBLICO_PATH}?mode=ro", uri=True)
+
+def garantir_banco_publico():
+    if banco_atualizado():
+        return
+    with trava_reconstrucao('banco_publico'):
+        # Outra sessão pode ter montado o banco enquanto esperávamos a trava
+        if not banco_atualizado():
+            construir_banco_publico()
+
+def _expressao(tabela, coluna):
+    # Só nomes do esquema (ou derivados) entram no SQL; valores vão sempre como parâmetros
+    if coluna in COLUNAS_DERIVADAS and tabela == 'dispensas':
+        return COLUNAS_DERIVADAS[coluna]
+    if coluna not in colunas_esquema(tabela):
+        raise ValueError(f"Coluna desconhecida para {tabela}: {coluna}")
+    return coluna
+
+def contar(tabela, agrupar_por, filtros=None, periodo=None):
+    """Contagem agrupada executada no banco.
+
+    'filtros' é {coluna: valor ou lista}; 'periodo' é (inicio, fim) em 'AAAA-MM-DD',
+    com fim exclusivo, aplicado sobre dt_disp. Devolve um DataFrame pequeno.
+    """
+    if tabela not in INDICES:
+        raise ValueError(f"Tabela desconhecida: {tabela}")
+    garantir_banco_publico()
+
+    selecao = [f"{_expressao(tabela, c)} AS {c}" for c in agrupar_por]
+    condicoes, parametros = [], []
+    for coluna, valor in (filtros or {}).items():
+        valores = list(valor) if isinstance(valor, (list, tuple, set)) else [valor]
+        condicoes.append(f"{_expressao(tabela, coluna)} IN ({', '.join('?' for _ in valores)})")
+        parametros += [str(v) for v in valores]
+    if periodo:
+        inicio, fim = periodo
+        condicoes.append("dt_disp >= ? AND dt_disp < ?")
+        parametros += [str(inicio), str(fim)]
+
+    sql = f"SELECT {', '.join(selecao + ['COUNT(*) AS contagem'])} FROM {tabela}"
+    if condicoes:
+        sql += " WHERE " + " AND ".join(condicoes)
+    if agrupar_por:
+        grupos = ', '.join(str(i + 1) for i in range(len(agrupar_por)))
+        sql += f" GROUP BY {grupos} ORDER BY {grupos}"
+
+    conn = _conectar()
+    try:
+        return pd.read_sql(sql, conn, params=parametros)
+    finally:
+        conn.close()
+
+def ler_dispensas(colunas, desde=None, tamanho_bloco=200_000):
+    """Gera blocos de dispensas com dt_disp >= 'desde' (AAAA-MM-DD), pelo índice de dt_disp"""
+    garantir_banco_publico()
+    sql = f"SELECT {', '.join(_expressao('dispensas', c) for c in colunas)} FROM dispensas"
+    parametros = []
+    if desde:
+        sql += " WHERE dt_disp >= ?"
+        parametros.append(str(desde))
+    conn = _conectar()
+    try:
+        yield from pd.read_sql(sql, conn, params=parametros, chunksize=tamanho_bloco)
+    finally:
+        conn.close()
+
+def contar_dispensas_antes(data):
+    """Quantidade de dispensas anteriores a 'data' (busca só no índice)"""
+    garantir_banco_publico()
+    conn = _conectar()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM dispensas WHERE dt_disp < ?", (str(data),)).fetchone()[0]
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    versoes = construir_banco_publico()
+    print(f"Banco {BANCO_PUBLICO_PATH} criado ({os.path.getsize(BANCO_PUBLICO_PATH) / 1e6:.1f} MB): {versoes}")
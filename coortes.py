@@ -0,0 +1,151 @@
+# coortes.py
+# Retenção por coorte: junção usuários x dispensas por códigos inteiros e matriz coorte x meses desde o início
+import json
+import numpy as np
+import pandas as pd
+from dados_publicos import CACHE_PATH, CHAVE_USUARIO, carregar_tabela, gravacao_atomica, trava_reconstrucao, versao_dataset
+from consultas_publicas import ler_dispensas
+
+COORTES_PATH = CACHE_PATH / 'coortes.parquet'
+MANIFESTO_COORTES_PATH = CACHE_PATH / 'coortes.json'
+
+# Cada par (usuário, mês) vira um único int64: código do usuário nos bits altos, mês nos baixos
+BITS_MES = 20
+MASCARA_MES = (1 << BITS_MES) - 1
+
+_coortes_memoria = {}
+
+def _codigos_usuarios():
+    """Índice de hash das chaves do cadastro: posição no índice = código inteiro do usuário"""
+    chaves = carregar_tabela('usuarios', colunas=[CHAVE_USUARIO])[CHAVE_USUARIO]
+    return pd.Index(chaves.astype(str).unique())
+
+def _mes_absoluto(datas):
+    # 'AAAA-MM-DD' -> ano * 12 + (mês - 1); datas inválidas viram -1
+    ano = pd.to_numeric(datas.str.slice(0, 4), errors='coerce')
+    mes = pd.to_numeric(datas.str.slice(5, 7), errors='coerce')
+    return (ano * 12 + mes - 1).fillna(-1).to_numpy(dtype='int64')
+
+def _pares_usuario_mes(usuarios, blocos):
+    """Pares distintos (código do usuário, mês) com ao menos uma dispensa.
+
+    A junção é um hash join: get_indexer procura cada chave das dispensas no índice
+    do cadastro e devolve o código inteiro (-1 quando o usuário não está cadastrado).
+    """
+    pares = []
+    sem_cadastro = 0
+    for bloco in blocos:
+        codigos = usuarios.get_indexer(bloco[CHAVE_USUARIO].astype(str))
+        meses = _mes_absoluto(bloco['dt_disp'].astype(str))
+        validos = (codigos >= 0) & (meses >= 0)
+        sem_cadastro += int((codigos < 0).sum())
+        pares.append(np.unique((codigos[validos].astype('int64') << BITS_MES) | meses[validos]))
+    if not pares:
+        return np.empty(0, dtype='int64'), sem_cadastro
+    return np.unique(np.concatenate(pares)), sem_cadastro
+
+def _matriz_coortes(pares):
+    """Conta usuários ativos por (coorte, meses desde a primeira dispensa) numa só passada.
+
+    'pares' vem ordenado por usuário e mês, então a primeira ocorrência de cada
+    usuário já é o mês de entrada na coorte.
+    """
+    codigos = pares >> BITS_MES
+    meses = pares & MASCARA_MES
+    _, inicio, por_usuario = np.unique(codigos, return_index=True, return_counts=True)
+    primeiro_mes = np.repeat(meses[inicio], por_usuario)
+
+    base = primeiro_mes.min()
+    coorte = primeiro_mes - base
+    desde_inicio = meses - primeiro_mes
+    largura = int(desde_inicio.max()) + 1
+    contagem = np.bincount(coorte * largura + desde_inicio, minlength=(int(coorte.max()) + 1) * largura)
+    return contagem.reshape(-1, largura), base
+
+def construir_coortes():
+    """Materializa a tabela (coorte, meses_desde_inicio, usuarios, retencao)"""
+    versao_usuarios = versao_dataset('usuarios')
+    versao_dispensas = versao_dataset('dispensas')
+    usuarios = _codigos_usuarios()
+    pares, sem_cadastro = _pares_usuario_mes(usuarios, ler_dispensas([CHAVE_USUARIO, 'dt_disp']))
+
+    if len(pares):
+        matriz, base = _matriz_coortes(pares)
+        coorte, desde_inicio = np.nonzero(matriz)
+        meses = base + coorte
+        tabela = pd.DataFrame({
+            'coorte': [f'{m // 12:04d}-{m % 12 + 1:02d}' for m in meses],
+            'meses_desde_inicio': desde_inicio.astype('int16'),
+            'usuarios': matriz[coorte, desde_inicio].astype('int64'),
+        })
+        tabela['retencao'] = tabela['usuarios'] / matriz[coorte, 0]
+    else:
+        tabela = pd.DataFrame({'coorte': pd.Series(dtype=str), 'meses_desde_inicio': pd.Series(dtype='int16'),
+                               'usuarios': pd.Series(dtype='int64'), 'retencao': pd.Series(dtype='float64')})
+
+    with gravacao_atomica(COORTES_PATH) as tmp_path:
+        tabela.to_parquet(tmp_path, index=False)
+    with gravacao_atomica(MANIFESTO_COORTES_PATH) as tmp_path:
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'versao_usuarios': versao_usuarios,
+                'versao_dispensas': versao_dispensas,
+                'usuarios': int(tabela.loc[tabela['meses_desde_inicio'] == 0, 'usuarios'].sum()),
+                'dispensas_sem_cadastro': sem_cadastro,
+            }, f, indent=2)
+    return tabela
+
+def carregar_coortes():
+    """Carrega a tabela de coortes, reconstruindo-a se usuários ou dispensas mudaram"""
+    versoes = (versao_dataset('usuarios'), versao_dataset('dispensas'))
+    if versoes in _coortes_memoria:
+        return _coortes_memoria[versoes]
+
+    with trava_reconstrucao('coortes'):
+        if versoes in _coortes_memoria:
+            return _coortes_memoria[versoes]
+        try:
+            with open(MANIFESTO_COORTES_PATH, 'r') as f:
+                manifesto = json.load(f)
+            valido = (manifesto.get('versao_usuarios'), manifesto.get('versao_dispensas')) == versoes
+        except (FileNotFoundError, json.JSONDecodeError):
+            valido = False
+
+        tabela = pd.read_parquet(COORTES_PATH) if valido and COORTES_PATH.exists() else construir_coortes()
+        _coortes_memoria.clear()
+        _coortes_memoria[versoes] = tabela
+        return tabela
+
+def matriz_retencao(tabela, meses=None):
+    """Matriz coorte x meses desde o início com a fração de usuários ainda ativos.
+
+    Células posteriores ao último mês dos dados ficam NaN (ainda não observáveis);
+    as observáveis sem dispensa ficam 0.
+    """
+    if meses is not None:
+        tabela = tabela[tabela['meses_desde_inicio'] <= meses]
+    matriz = tabela.pivot_table(index='coorte', columns='meses_desde_inicio', values='retencao')
+    colunas = range(int(tabela['meses_desde_inicio'].max()) + 1) if len(tabela) else []
+    matriz = matriz.reindex(columns=colunas)
+
+    coortes = pd.PeriodIndex(matriz.index, freq='M')
+    inicio = pd.PeriodIndex(tabela['coorte'], freq='M')
+    ultimo_mes = (inicio + tabela['meses_desde_inicio'].to_numpy()).max() if len(tabela) else None
+    # Meses decorridos entre cada coorte e o fim dos dados
+    idade = np.array([(ultimo_mes - c).n for c in coortes]) if len(coortes) else np.empty(0, dtype=int)
+    observavel = np.asarray(matriz.columns)[None, :] <= idade[:, None]
+    return matriz.fillna(0).where(observavel)
+
+def curva_retencao(tabela, matriz):
+    """Retenção média por mês desde o início, ponderada pelo tamanho das coortes observadas naquele mês"""
+    tamanhos = tabela[tabela['meses_desde_inicio'] == 0].set_index('coorte')['usuarios']
+    pesos = pd.DataFrame(np.broadcast_to(tamanhos.reindex(matriz.index).to_numpy()[:, None], matriz.shape),
+                         index=matriz.index, columns=matriz.columns).where(matriz.notna())
+    return (matriz * pesos).sum() / pesos.sum()
+
+if __name__ == "__main__":
+    tabela = construir_coortes()
+    with open(MANIFESTO_COORTES_PATH, 'r') as f:
+        manifesto = json.load(f)
+    print(f"{tabela['coorte'].nunique()} coortes, {manifesto['usuarios']} usuários "
+          f"({manifesto['dispensas_sem_cadastro']} dispensas sem cadastro)")
@@ -0,0 +1,83 @@
+# cubo.py
+# Cubo de contagens pré-calculadas dos usuários de PrEP por dimensões demográficas
+import json
+import os
+import pandas as pd
+from dados_publicos import (CACHE_PATH, ESQUEMAS, abrir_tabela_arrow, carregar_tabela, gravacao_atomica,
+                            trava_reconstrucao, versao_dataset)
+
+# Dimensões do cubo: todas as colunas categóricas dos usuários
+DIMENSOES = ESQUEMAS['usuarios']['categorias']
+
+CUBO_PATH = CACHE_PATH / 'cubo_usuarios.parquet'
+MANIFESTO_CUBO_PATH = CACHE_PATH / 'cubo_usuarios.json'
+
+_cubo_memoria = {}
+
+def construir_cubo():
+    """Materializa a contagem de usuários para cada combinação das dimensões"""
+    versao = versao_dataset('usuarios')
+    try:
+        # Agrupa direto na tabela Arrow mapeada em memória: só o cubo (pequeno)
+        # vira DataFrame, sem copiar o cadastro inteiro para o pandas
+        tabela = abrir_tabela_arrow('usuarios')
+        dimensoes = [d for d in DIMENSOES if d in tabela.column_names]
+        cubo = tabela.group_by(dimensoes).aggregate([([], 'count_all')]).to_pandas()
+        cubo = cubo.rename(columns={'count_all': 'contagem'})
+    except ImportError:
+        df = carregar_tabela('usuarios')
+        dimensoes = [d for d in DIMENSOES if d in df.columns]
+        cubo = df.groupby(dimensoes, observed=True, dropna=False).size().reset_index(name='contagem')
+
+    with gravacao_atomica(CUBO_PATH) as tmp_path:
+        cubo.to_parquet(tmp_path, index=False)
+    with gravacao_atomica(MANIFESTO_CUBO_PATH) as tmp_path:
+        with open(tmp_path, 'w') as f:
+            json.dump({'versao_usuarios': versao, 'celulas': len(cubo), 'usuarios': int(cubo['contagem'].sum())}, f, indent=2)
+    return cubo
+
+def carregar_cubo():
+    """Carrega o cubo, reconstruindo-o se os dados de usuários mudaram"""
+    versao = versao_dataset('usuarios')
+    if versao in _cubo_memoria:
+        return _cubo_memoria[versao]
+
+    with trava_reconstrucao('cubo'):
+        # Conferido de novo com a trava: outra sessão pode ter acabado de reconstruir
+        if versao in _cubo_memoria:
+            return _cubo_memoria[versao]
+        try:
+            with open(MANIFESTO_CUBO_PATH, 'r') as f:
+                valido = json.load(f).get('versao_usuarios') == versao
+        except (FileNotFoundError, json.JSONDecodeError):
+            valido = False
+
+        cubo = pd.read_parquet(CUBO_PATH) if valido and CUBO_PATH.exists() else construir_cubo()
+        _cubo_memoria.clear()
+        _cubo_memoria[versao] = cubo
+        return cubo
+
+def consultar_cubo(dimensoes, filtros=None):
+    """Contagem de usuários agrupada por 'dimensoes'.
+
+    'filtros' é um dicionário {dimensao: valor ou lista de valores}.
+    """
+    cubo = carregar_cubo()
+    dimensoes = [d for d in dimensoes if d in cubo.columns]
+    if filtros:
+        mascara = pd.Series(True, index=cubo.index)
+        for dimensao, valor in filtros.items():
+            valores = valor if isinstance(valor, (list, tuple, set)) else [valor]
+            mascara &= cubo[dimensao].isin(valores)
+        cubo = cubo[mascara]
+    if not dimensoes:
+        return pd.DataFrame({'contagem': [int(cubo['contagem'].sum())]})
+    return cubo.groupby(dimensoes, observed=True)['contagem'].sum().reset_index()
+
+def dimensoes_disponiveis():
+    return [d for d in DIMENSOES if d in carregar_cubo().columns]
+
+if __name__ == "__main__":
+    cubo = construir_cubo()
+    print(f"Cubo com {len(cubo)} células ({cubo.memory_usage(deep=True).sum() / 1024:.0f} KB em memória, "
+          f"{os.path.getsize(CUBO_PATH) / 1024:.0f} KB em disco)")
@@ -0,0 +1,556 @@
+# dados_publicos.py
+# Carregamento dos dados públicos do Ministério da Saúde com cache colunar (Arrow IPC)
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+except ImportError:
+    pa = None
+    pa_csv = None
+
+DATA_PATH = Path('data')
+CACHE_PATH = DATA_PATH / 'cache'
+
+# Arquivos oficiais por dataset
+ARQUIVOS_PUBLICOS = {
+    'usuarios': 'Banco_PrEP_usuarios.csv',
+    'dispensas': 'Banco_PrEP_dispensas.csv',
+}
+
+# Colunas usadas pelos painéis: apenas elas são carregadas. As categóricas ficam
+# como 'category' (códigos inteiros pequenos) e as datas são convertidas uma única vez.
+# 'chaves' liga usuários e dispensas; também é guardada como 'category', o que nas
+# dispensas (muitas linhas por usuário) reduz a coluna a códigos inteiros
+ESQUEMAS = {
+    'usuarios': {
+        'chaves': ['Cod_unificado'],
+        'categorias': ['raca4_cat', 'escol4', 'fetar', 'Pop_genero_pratica', 'UF_UDM', 'Disp_12m_2024'],
+        'datas': [],
+    },
+    'dispensas': {
+        'chaves': ['Cod_unificado'],
+        'categorias': ['tp_servico_atendimento', 'tp_profissional'],
+        'datas': ['dt_disp'],
+    },
+}
+
+CHAVE_USUARIO = 'Cod_unificado'
+
+# Motores de leitura dos CSVs oficiais (escolhido pela variável PREP_MOTOR_CSV).
+# 'pandas' é o parser C padrão; os demais usam o leitor multithread do Arrow e,
+# se falharem ou o pyarrow não estiver instalado, voltam para 'pandas'.
+# Compare os motores no servidor com: python benchmark_leitura.py
+MOTORES_CSV = ('pandas', 'pandas-pyarrow', 'pyarrow')
+MOTOR_CSV_PADRAO = 'pandas'
+
+# Travas de reconstrução dos artefatos de cache. As sessões do Streamlit são threads
+# do mesmo processo: sem elas, duas sessões que encontram o cache vencido ao mesmo
+# tempo fariam a mesma conversão completa em paralelo
+_travas_reconstrucao = {}
+_trava_travas = threading.Lock()
+
+def trava_reconstrucao(nome):
+    """Trava (reentrante) do processo para reconstruir o artefato 'nome'"""
+    with _trava_travas:
+        if nome not in _travas_reconstrucao:
+            _travas_reconstrucao[nome] = threading.RLock()
+        return _travas_reconstrucao[nome]
+
+@contextmanager
+def gravacao_atomica(destino):
+    """Entrega um arquivo temporário exclusivo ao lado de 'destino' e o publica ao final.
+
+    O nome único (mkstemp) evita que duas threads escrevam no mesmo temporário;
+    os.replace troca o destino de uma vez. Em caso de erro o temporário é removido.
+    """
+    destino = Path(destino)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    descritor, caminho = tempfile.mkstemp(prefix=f'.{destino.name}.', suffix='.tmp', dir=destino.parent)
+    os.close(descritor)
+    tmp_path = Path(caminho)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, destino)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+def colunas_esquema(nome):
+    esquema = ESQUEMAS[nome]
+    return esquema['chaves'] + esquema['categorias'] + esquema['datas']
+
+def _versao_esquema(nome):
+    return hashlib.sha256(json.dumps(ESQUEMAS[nome], sort_keys=True).encode()).hexdigest()[:16]
+
+def _hash_arquivo(caminho, tamanho_bloco=1 << 20):
+    """Calcula o SHA-256 do arquivo lendo em blocos"""
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+def assinatura_arquivo(caminho):
+    """Retorna tamanho, data de modificação e hash do arquivo de origem"""
+    info = os.stat(caminho)
+    return {
+        'tamanho': info.st_size,
+        'mtime_ns': info.st_mtime_ns,
+        'sha256': _hash_arquivo(caminho)
+    }
+
+def _caminhos_cache(nome):
+    return CACHE_PATH / f'{nome}.arrow', CACHE_PATH / f'{nome}.json'
+
+def _ler_manifesto(nome):
+    _, manifesto_path = _caminhos_cache(nome)
+    try:
+        with open(manifesto_path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def _gravar_manifesto(nome, manifesto):
+    _, manifesto_path = _caminhos_cache(nome)
+    with gravacao_atomica(manifesto_path) as tmp_path:
+        with open(tmp_path, 'w') as f:
+            json.dump(manifesto, f, indent=2)
+
+# Tamanho mínimo e máximo de cada faixa de bytes lida em paralelo. O máximo limita a
+# memória da conversão para o cache: cada faixa é um lote gravado e descartado
+TAMANHO_MINIMO_FAIXA = 16 * 1024 * 1024
+TAMANHO_MAXIMO_FAIXA = 32 * 1024 * 1024
+
+def arquivos_partes(nome):
+    """Partes do arquivo oficial (ex.: Banco_PrEP_dispensas_1.csv, _2.csv), em ordem numérica"""
+    base = Path(ARQUIVOS_PUBLICOS[nome]).stem
+    padrao = re.compile(rf'^{re.escape(base)}_(\d+)\.csv$')
+    partes = [p for p in DATA_PATH.glob(f'{base}_*.csv') if padrao.match(p.name)]
+    return sorted(partes, key=lambda p: int(padrao.match(p.name).group(1)))
+
+def _fontes(nome):
+    completo = DATA_PATH / ARQUIVOS_PUBLICOS[nome]
+    fontes = [completo] if completo.exists() else []
+    fontes += arquivos_partes(nome)
+    return fontes or [completo]
+
+def fonte_inalterada(fonte, registro):
+    """Compara o arquivo com a assinatura registrada (atualiza o mtime se só ele mudou)"""
+    info = os.stat(fonte)
+    if info.st_size != registro['tamanho']:
+        return False
+    if info.st_mtime_ns != registro['mtime_ns']:
+        # Mesmo tamanho mas data diferente: confere o conteúdo pelo hash
+        if _hash_arquivo(fonte) != registro['sha256']:
+            return False
+        registro['mtime_ns'] = info.st_mtime_ns
+    return True
+
+def cache_valido(nome, fontes):
+    """Verifica se o cache do dataset corresponde aos arquivos de origem"""
+    arrow_path, _ = _caminhos_cache(nome)
+    manifesto = _ler_manifesto(nome)
+    if manifesto is None or not arrow_path.exists():
+        return False
+
+    if manifesto.get('esquema') != _versao_esquema(nome):
+        return False
+
+    registradas = manifesto.get('fontes', {})
+    if set(registradas) != {fonte.name for fonte in fontes}:
+        return False
+
+    atualizado = False
+    for fonte in fontes:
+        registro = registradas[fonte.name]
+        mtime_anterior = registro['mtime_ns']
+        if not fonte_inalterada(fonte, registro):
+            return False
+        atualizado = atualizado or registro['mtime_ns'] != mtime_anterior
+
+    if atualizado:
+        _gravar_manifesto(nome, manifesto)
+    return True
+
+def _opcoes_csv(nome):
+    esquema = ESQUEMAS[nome]
+    colunas = set(colunas_esquema(nome))
+    return {
+        'encoding': 'latin1',
+        'sep': ',',
+        'usecols': lambda c: c in colunas,
+        'dtype': {c: 'category' for c in esquema['chaves'] + esquema['categorias']},
+    }
+
+def _converter_datas(df, nome):
+    for coluna in ESQUEMAS[nome]['datas']:
+        if coluna in df.columns:
+            df[coluna] = pd.to_datetime(df[coluna], errors='coerce')
+    return df
+
+def motor_csv():
+    motor = os.environ.get('PREP_MOTOR_CSV', MOTOR_CSV_PADRAO)
+    if motor not in MOTORES_CSV:
+        print(f"Motor de leitura desconhecido '{motor}', usando '{MOTOR_CSV_PADRAO}'")
+        return MOTOR_CSV_PADRAO
+    return motor
+
+def _colunas_do_cabecalho(caminho):
+    # Os motores Arrow exigem a lista exata de colunas: só as do esquema presentes no arquivo
+    if isinstance(caminho, io.BytesIO):
+        cabecalho = caminho.getvalue().split(b'\n', 1)[0]
+    else:
+        with open(caminho, 'rb') as f:
+            cabecalho = f.readline()
+    return [c.strip().strip('"') for c in cabecalho.decode('latin1').rstrip('\r\n').split(',')]
+
+def _ler_csv_pandas(caminho, nome):
+    return pd.read_csv(caminho, **_opcoes_csv(nome))
+
+def _ler_csv_pandas_pyarrow(caminho, nome):
+    esquema = ESQUEMAS[nome]
+    presentes = set(_colunas_do_cabecalho(caminho))
+    colunas = [c for c in colunas_esquema(nome) if c in presentes]
+    categorias = [c for c in esquema['chaves'] + esquema['categorias'] if c in presentes]
+    # Lidas como texto e convertidas depois: o motor pyarrow inferiria categorias numéricas
+    df = pd.read_csv(caminho, engine='pyarrow', encoding='latin1', sep=',', usecols=colunas,
+                     dtype={c: 'str' for c in colunas})
+    df[categorias] = df[categorias].astype('category')
+    return df
+
+def _ler_csv_pyarrow(caminho, nome):
+    if pa_csv is None:
+        raise ImportError("pyarrow não está instalado")
+    esquema = ESQUEMAS[nome]
+    presentes = set(_colunas_do_cabecalho(caminho))
+    colunas = [c for c in colunas_esquema(nome) if c in presentes]
+    tipos = {c: pa.string() for c in colunas}
+    # Dicionário Arrow vira 'category' no pandas sem passar por strings Python
+    tipos.update({c: pa.dictionary(pa.int32(), pa.string())
+                  for c in esquema['chaves'] + esquema['categorias'] if c in presentes})
+    if isinstance(caminho, Path):
+        caminho = str(caminho)
+    tabela = pa_csv.read_csv(
+        caminho,
+        read_options=pa_csv.ReadOptions(encoding='latin1', use_threads=True),
+        parse_options=pa_csv.ParseOptions(delimiter=','),
+        convert_options=pa_csv.ConvertOptions(include_columns=colunas, column_types=tipos,
+                                              strings_can_be_null=True),
+    )
+    return tabela.to_pandas()
+
+_LEITORES_CSV = {
+    'pandas': _ler_csv_pandas,
+    'pandas-pyarrow': _ler_csv_pandas_pyarrow,
+    'pyarrow': _ler_csv_pyarrow,
+}
+
+def _ler_csv(caminho, nome, motor=None):
+    """Lê o CSV oficial projetando as colunas do esquema com seus tipos"""
+    motor = motor or motor_csv()
+    if motor != 'pandas':
+        try:
+            return _converter_datas(_LEITORES_CSV[motor](caminho, nome), nome)
+        except (ImportError, ValueError) as e:
+            # ArrowInvalid é subclasse de ValueError
+            print(f"Falha na leitura com o motor '{motor}' ({e}); usando 'pandas'")
+            if isinstance(caminho, io.BytesIO):
+                caminho.seek(0)
+    return _converter_datas(_ler_csv_pandas(caminho, nome), nome)
+
+def ler_csv_em_blocos(caminhos, nome, tamanho_bloco=250_000):
+    """Gera blocos tipados dos CSVs sem manter o arquivo inteiro em memória"""
+    for caminho in caminhos:
+        with pd.read_csv(caminho, chunksize=tamanho_bloco, **_opcoes_csv(nome)) as leitor:
+            for bloco in leitor:
+                yield _converter_datas(bloco, nome)
+
+def versao_arquivos(caminhos):
+    """Identifica a versão dos arquivos pelo tamanho e data de modificação (sem ler o conteúdo)"""
+    return tuple((Path(c).name, os.stat(c).st_size, os.stat(c).st_mtime_ns) for c in caminhos)
+
+def _concatenar(partes):
+    """Concatena mantendo as colunas categóricas (com a união das categorias)"""
+    partes = [parte for parte in partes if len(parte.columns)]
+    if not partes:
+        return pd.DataFrame()
+    for coluna in partes[0].select_dtypes('category').columns:
+        categorias = union_categoricals([parte[coluna] for parte in partes], ignore_order=True).categories
+        for parte in partes:
+            parte[coluna] = parte[coluna].cat.set_categories(categorias)
+    return pd.concat(partes, ignore_index=True)
+
+def _faixas_de_bytes(caminho, tamanho_faixa):
+    """Divide o arquivo em faixas de bytes alinhadas ao fim de linha, após o cabeçalho"""
+    tamanho = os.path.getsize(caminho)
+    with open(caminho, 'rb') as f:
+        cabecalho = f.readline()
+        inicio = f.tell()
+        faixas = []
+        while inicio < tamanho:
+            f.seek(min(inicio + tamanho_faixa, tamanho))
+            f.readline()
+            fim = min(f.tell(), tamanho)
+            faixas.append((inicio, fim))
+            inicio = fim
+    return cabecalho, faixas
+
+def _ler_faixa(caminho, nome, cabecalho, inicio, fim):
+    # Executada nos processos de trabalho; não há campos com quebra de linha nos arquivos oficiais
+    with open(caminho, 'rb') as f:
+        f.seek(inicio)
+        dados = f.read(fim - inicio)
+    return _ler_csv(io.BytesIO(cabecalho + dados), nome)
+
+class _Ocorrencias:
+    """Quantas vezes cada hash de linha já apareceu, em arrays ordenados (16 bytes por hash distinto)"""
+    def __init__(self):
+        self.hashes = np.empty(0, dtype='uint64')
+        self.contagens = np.empty(0, dtype='int64')
+
+    def consultar(self, hashes):
+        if not len(self.hashes):
+            return np.zeros(len(hashes), dtype='int64')
+        posicoes = np.minimum(np.searchsorted(self.hashes, hashes), len(self.hashes) - 1)
+        return np.where(self.hashes[posicoes] == hashes, self.contagens[posicoes], 0)
+
+    def acrescentar(self, hashes):
+        novos, contagens = np.unique(hashes, return_counts=True)
+        posicoes = np.searchsorted(self.hashes, novos)
+        existentes = posicoes < len(self.hashes)
+        existentes[existentes] = self.hashes[posicoes[existentes]] == novos[existentes]
+        self.contagens[posicoes[existentes]] += contagens[existentes]
+        self.hashes = np.insert(self.hashes, posicoes[~existentes], novos[~existentes])
+        self.contagens = np.insert(self.contagens, posicoes[~existentes], contagens[~existentes])
+
+class _Deduplicador:
+    """Remove, bloco a bloco, as linhas das partes que já vieram do arquivo completo.
+
+    Cada linha recebe o número da sua ocorrência dentro do grupo (0: completo,
+    1: partes); ficam os pares (hash, ocorrência) distintos, ou seja, o máximo de
+    repetições entre os grupos. Linhas repetidas legítimas dentro de um mesmo
+    arquivo são preservadas. Os blocos do arquivo completo vêm antes dos das
+    partes, então uma linha das partes fica se sua ocorrência ainda não foi vista
+    no completo. Só as contagens por hash ficam em memória, nunca as linhas.
+    """
+    def __init__(self):
+        self.ocorrencias = {0: _Ocorrencias(), 1: _Ocorrencias()}
+
+    def filtrar(self, grupo, df):
+        hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        if grupo == 0:
+            self.ocorrencias[0].acrescentar(hashes)
+            return df
+        ocorrencia = self.ocorrencias[1].consultar(hashes) + pd.Series(hashes).groupby(hashes).cumcount().to_numpy()
+        self.ocorrencias[1].acrescentar(hashes)
+        manter = ocorrencia >= self.ocorrencias[0].consultar(hashes)
+        return df if manter.all() else df[manter].reset_index(drop=True)
+
+def _tarefas(nome, processos):
+    """Faixas de bytes (grupo, argumentos de _ler_faixa) do arquivo completo e depois das partes"""
+    fontes = _fontes(nome)
+    total = sum(os.path.getsize(fonte) for fonte in fontes)
+    tamanho_faixa = min(max(TAMANHO_MINIMO_FAIXA, total // (processos * 2) + 1), TAMANHO_MAXIMO_FAIXA)
+
+    tarefas = []
+    for fonte in fontes:
+        cabecalho, faixas = _faixas_de_bytes(fonte, tamanho_faixa)
+        # Grupo 0: arquivo completo; grupo 1: todas as partes juntas
+        grupo = 0 if fonte.name == ARQUIVOS_PUBLICOS[nome] else 1
+        tarefas += [(grupo, (fonte, nome, cabecalho, inicio, fim)) for inicio, fim in faixas]
+    return tarefas
+
+def ler_blocos_paralelo(nome, processos=None):
+    """Gera, na ordem dos arquivos, um bloco sem duplicatas por faixa de bytes.
+
+    As faixas são lidas em paralelo, com no máximo 'processos' em andamento:
+    a memória depende do tamanho da faixa, não do tamanho do dataset.
+    """
+    processos = processos or int(os.environ.get('PREP_PROCESSOS', os.cpu_count() or 1))
+    tarefas = _tarefas(nome, processos)
+    # Sem partes junto do arquivo completo (ou vice-versa) não há o que deduplicar
+    deduplicador = _Deduplicador() if len({grupo for grupo, _ in tarefas}) > 1 else None
+
+    def filtrar(grupo, parte):
+        return deduplicador.filtrar(grupo, parte) if deduplicador else parte
+
+    if processos > 1 and len(tarefas) > 1:
+        # 'spawn' evita fork de um servidor Streamlit com várias threads
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(processos, len(tarefas)), mp_context=contexto) as executor:
+            pendentes = deque()
+            for grupo, args in tarefas:
+                pendentes.append((grupo, executor.submit(_ler_faixa, *args)))
+                if len(pendentes) >= processos:
+                    grupo, futuro = pendentes.popleft()
+                    yield filtrar(grupo, futuro.result())
+            while pendentes:
+                grupo, futuro = pendentes.popleft()
+                yield filtrar(grupo, futuro.result())
+    else:
+        for grupo, args in tarefas:
+            yield filtrar(grupo, _ler_faixa(*args))
+
+def carregar_paralelo(nome, processos=None):
+    """Lê o arquivo completo e suas partes em paralelo, por faixas de bytes, e junta o resultado"""
+    return _concatenar(list(ler_blocos_paralelo(nome, processos)))
+
+def _gravar_arrow(blocos, caminho):
+    """Grava os blocos num arquivo Arrow IPC, um lote por bloco, e devolve o total de linhas.
+
+    O formato de arquivo só aceita dicionários que crescem por acréscimo (deltas):
+    as categorias de cada coluna acumulam as de todos os blocos anteriores.
+    """
+    opcoes = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+    escritor = None
+    categorias = {}
+    linhas = 0
+    try:
+        for bloco in blocos:
+            if not len(bloco.columns):
+                continue
+            for coluna in bloco.select_dtypes('category').columns:
+                novas = bloco[coluna].cat.categories
+                anteriores = categorias.get(coluna)
+                if anteriores is not None:
+                    novas = anteriores.append(novas[anteriores.get_indexer(novas) < 0])
+                categorias[coluna] = novas
+                bloco[coluna] = bloco[coluna].cat.set_categories(novas)
+            if escritor is None:
+                # Índices int32 em todos os lotes: o pandas escolhe int8/int16 conforme o bloco
+                esquema = pa.schema([
+                    pa.field(campo.name, pa.dictionary(pa.int32(), pa.string()))
+                    if pa.types.is_dictionary(campo.type) else campo
+                    for campo in pa.Schema.from_pandas(bloco, preserve_index=False)
+                ])
+                escritor = pa.ipc.new_file(str(caminho), esquema, options=opcoes)
+            escritor.write_table(pa.Table.from_pandas(bloco, schema=esquema, preserve_index=False))
+            linhas += len(bloco)
+        if escritor is None:
+            escritor = pa.ipc.new_file(str(caminho), pa.schema([]), options=opcoes)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return linhas
+
+def converter_para_cache(nome):
+    """Converte o CSV oficial do dataset para Arrow IPC e registra o manifesto.
+
+    Grava em fluxo, um lote por faixa de bytes: nem o dataset inteiro nem a
+    concatenação das partes passam pela memória. Devolve o número de linhas.
+    """
+    if pa is None:
+        raise ImportError("pyarrow é necessário para o cache colunar")
+    fontes = _fontes(nome)
+    # Assinatura tirada antes da leitura: se o arquivo mudar durante a conversão,
+    # o próximo carregamento detecta a diferença e reconstrói o cache
+    assinaturas = {fonte.name: assinatura_arquivo(fonte) for fonte in fontes}
+
+    arrow_path, _ = _caminhos_cache(nome)
+    # os.replace troca o arquivo sem afetar mapeamentos abertos do arquivo anterior.
+    # Sem compressão: o arquivo pode ser mapeado em memória e lido sem cópia
+    with gravacao_atomica(arrow_path) as tmp_path:
+        linhas = _gravar_arrow(ler_blocos_paralelo(nome), tmp_path)
+
+    _gravar_manifesto(nome, {'fontes': assinaturas, 'esquema': _versao_esquema(nome), 'linhas': linhas})
+    return linhas
+
+def _garantir_fontes(nome):
+    fontes = _fontes(nome)
+    for fonte in fontes:
+        if not fonte.exists():
+            raise FileNotFoundError(fonte)
+    return fontes
+
+def _garantir_cache(nome, fontes):
+    if cache_valido(nome, fontes):
+        return
+    with trava_reconstrucao(nome):
+        # Outra sessão pode ter reconstruído o cache enquanto esperávamos a trava
+        if not cache_valido(nome, fontes):
+            converter_para_cache(nome)
+
+def abrir_tabela_arrow(nome, colunas=None):
+    """Tabela Arrow mapeada em memória a partir do cache, sem cópia dos dados.
+
+    Os buffers apontam para o arquivo mapeado: processos diferentes que abrem o
+    mesmo cache compartilham as páginas pelo cache de páginas do sistema operacional.
+    Isso vale enquanto se trabalha na tabela Arrow; to_pandas copia os dados.
+    """
+    if pa is None:
+        raise ImportError("pyarrow é necessário para o cache colunar")
+    fontes = _garantir_fontes(nome)
+    _garantir_cache(nome, fontes)
+    arrow_path, _ = _caminhos_cache(nome)
+    tabela = pa.ipc.open_file(pa.memory_map(str(arrow_path), 'r')).read_all()
+    return tabela.select(colunas) if colunas else tabela
+
+def carregar_tabela(nome, colunas=None):
+    """Carrega um dataset oficial pelo cache colunar, reconstruindo-o se a origem mudou.
+
+    O DataFrame é uma cópia privada do processo (to_pandas copia o mapeamento):
+    para varrer a tabela inteira, prefira agregar em abrir_tabela_arrow.
+    """
+    _garantir_fontes(nome)
+    try:
+        return abrir_tabela_arrow(nome, colunas).to_pandas(split_blocks=True)
+    except ImportError:
+        # Sem pyarrow não há cache colunar: lê os CSVs diretamente
+        df = carregar_paralelo(nome)
+        return df[colunas] if colunas else df
+
+def versao_dataset(nome):
+    """Versão do dataset (hash das fontes e do esquema), garantindo o cache atualizado"""
+    fontes = _garantir_fontes(nome)
+    _garantir_cache(nome, fontes)
+    manifesto = _ler_manifesto(nome)
+    hashes = sorted((nome_fonte, r['sha256']) for nome_fonte, r in manifesto['fontes'].items())
+    return hashlib.sha256(json.dumps([hashes, manifesto['esquema']]).encode()).hexdigest()[:16]
+
+def relatorio_memoria(nome):
+    """Compara, por coluna, a memória tipada com a mesma coluna como strings Python"""
+    df = carregar_tabela(nome)
+    linhas = []
+    for coluna in df.columns:
+        bytes_tipado = df[coluna].memory_usage(deep=True, index=False)
+        bytes_objeto = df[coluna].astype(str).astype(object).memory_usage(deep=True, index=False)
+        linhas.append({
+            'coluna': coluna,
+            'tipo': str(df[coluna].dtype),
+            'bytes_objeto': bytes_objeto,
+            'bytes_tipado': bytes_tipado,
+            'bytes_economizados': bytes_objeto - bytes_tipado,
+        })
+    relatorio = pd.DataFrame(linhas)
+    relatorio['reducao'] = (relatorio['bytes_objeto'] / relatorio['bytes_tipado']).round(1)
+    return relatorio
+
+if __name__ == "__main__":
+    import sys
+
+    # Conversão dos CSVs oficiais para o cache colunar
+    for nome in ARQUIVOS_PUBLICOS:
+        linhas = converter_para_cache(nome)
+        print(f"{nome}: {linhas} linhas convertidas para {_caminhos_cache(nome)[0]}")
+
+    if '--relatorio' in sys.argv:
+        for nome in ARQUIVOS_PUBLICOS:
+            relatorio = relatorio_memoria(nome)
+            print(f"\n📦 Memória por coluna - {nome}")
+            print(relatorio.to_string(index=False))
+            print(f"Total economizado: {relatorio['bytes_economizados'].sum() / 1e6:.1f} MB")
@@ -1,140 +1,184 @@
 # database.py (Versão SQLite - Funciona Imediatamente)
 import streamlit as st
-import sqlite3
 import pandas as pd
 import os
-from datetime import datetime
-from backup_manager import BackupManager
+import csv
+import json
+import hashlib
+import time
+import threading
+from datetime import datetime, timezone
+from backup_manager import obter_agendador
+from conexao import conexao
+from esquema import CAMPOS_MULTIPLOS, garantir_esquema, preenchimento_pendente
+from diario_respostas import COLUNAS_RESPOSTA, inserir_lote, novo_registro, obter_diario
+
+# Colunas dos arquivos de emergência com nome diferente da coluna em respostas
+MAPA_COLUNAS_EMERGENCIA = {'timestamp': 'data_envio'}
 
 def carregar_dados_iniciais():
     """Carrega dados iniciais do CSV se o banco estiver vazio"""
     try:
-        conn = sqlite3.connect('pesquisa_prep.db')
-        cursor = conn.cursor()
-        
-        # Verificar se já existem respostas
-        cursor.execute("SELECT COUNT(*) FROM respostas")
-        count = cursor.fetchone()[0]
-        
-        # Se não existem respostas e existe arquivo CSV, carregar dados
-        if count == 0 and os.path.exists('dados_iniciais.csv'):
-            df = pd.read_csv('dados_iniciais.csv')
+        with conexao() as conn:
+            # Trava de escrita: dois processos iniciando juntos não carregam os dados duas vezes
+            conn.execute("BEGIN IMMEDIATE")
             
-            # Remover colunas id e data_envio do CSV (serão geradas automaticamente)
-            if 'id' in df.columns:
-                df = df.drop('id', axis=1)
-            if 'data_envio' in df.columns:
-                df = df.drop('data_envio', axis=1)
+            # Verificar se já existem respostas (LIMIT 1 não percorre a tabela)
+            vazio = conn.execute("SELECT 1 FROM respostas LIMIT 1").fetchone() is None
             
-            # Inserir dados no banco
-            df.to_sql('respostas', conn, if_exists='append', index=False)
-            st.success(f"✅ {len(df)} respostas iniciais carregadas do arquivo de dados!")
-            
-        conn.close()
+            # Se não existem respostas e existe arquivo CSV, carregar dados
+            if vazio and os.path.exists('dados_iniciais.csv'):
+                df = pd.read_csv('dados_iniciais.csv')
+                
+                # Remover colunas id e data_envio do CSV (serão geradas automaticamente)
+                if 'id' in df.columns:
+                    df = df.drop('id', axis=1)
+                if 'data_envio' in df.columns:
+                    df = df.drop('data_envio', axis=1)
+                
+                # Inserir dados no banco
+                df.to_sql('respostas', conn, if_exists='append', index=False)
+                st.success(f"✅ {len(df)} respostas iniciais carregadas do arquivo de dados!")
         
     except Exception as e:
         st.error(f"Erro ao carregar dados iniciais: {e}")
 
-def criar_tabela_respostas():
-    """Cria a tabela de respostas usando SQLite"""
-    conn = sqlite3.connect('pesquisa_prep.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS respostas (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        data_envio TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        idade TEXT,
-        genero TEXT,
-        orientacao_sexual TEXT,
-        raca TEXT,
-        escolaridade TEXT,
-        renda TEXT,
-        regiao TEXT,
-        status_relacional TEXT,
-        conhecimento_prep TEXT,
-        uso_prep TEXT,
-        objetivo_prep TEXT,
-        acesso_servico TEXT,
-        fonte_info TEXT,
-        barreiras TEXT,
-        percepcao_risco INTEGER,
-        efeitos_colaterais_teve TEXT,
-        efeitos_colaterais_quais TEXT,
-        comentarios TEXT
-    )
-    ''')
-    conn.commit()
-    conn.close()
+_banco_preparado = False
+_trava_preparo = threading.Lock()
+
+def preparar_banco():
+    """Aplica as migrações do esquema e carrega os dados iniciais.
     
-    # Carregar dados iniciais se necessário
-    carregar_dados_iniciais()
+    Só trabalha na primeira chamada do processo; as seguintes (a cada rerun do
+    Streamlit) não abrem conexão nenhuma.
+    """
+    global _banco_preparado
+    if _banco_preparado:
+        return
+    with _trava_preparo:
+        if _banco_preparado:
+            return
+        garantir_esquema()
+        carregar_dados_iniciais()
+        _banco_preparado = True
 
 def salvar_resposta(resposta):
-    """Salva uma resposta no SQLite com backup automático"""
+    """Salva uma resposta pelo diário de envios; o repasse ao SQLite e o backup são feitos em segundo plano"""
+    # O mesmo id_submissao no diário e no caminho direto: se o diário só demorou e
+    # ainda gravar a resposta depois, o repasse a ignora em vez de duplicá-la
+    registro = novo_registro(resposta)
     try:
-        # Salvar no banco principal
-        conn = sqlite3.connect('pesquisa_prep.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-        INSERT INTO respostas 
-        (idade, genero, orientacao_sexual, raca, escolaridade, renda, regiao, status_relacional,
-         conhecimento_prep, uso_prep, objetivo_prep, acesso_servico, fonte_info, barreiras, 
-         percepcao_risco, efeitos_colaterais_teve, efeitos_colaterais_quais, comentarios)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', tuple(resposta.values()))
-        conn.commit()
-        conn.close()
-        
-        # Criar backup automático após salvar
-        backup_manager = BackupManager()
-        backup_resultado = backup_manager.backup_completo()
+        # Volta assim que a resposta está gravada (com fsync) no diário
+        obter_diario(ao_repassar=obter_agendador().notificar).registrar(registro)
         
-        # Salvar também em arquivo CSV de emergência
-        salvar_backup_csv_emergencia(resposta)
-        
-        st.success("✅ Resposta enviada e backup realizado com sucesso!")
+        st.success("✅ Resposta enviada com sucesso!")
         st.balloons()
-        
-        # Mostrar informações do backup (opcional, para transparência)
-        with st.expander("ℹ️ Informações do Backup"):
-            st.write(f"**Total de respostas salvas:** {backup_manager.contar_respostas()}")
-            if backup_resultado['csv_backup']:
-                st.write(f"**Backup CSV:** {os.path.basename(backup_resultado['csv_backup'])}")
-            if backup_resultado['json_backup']:
-                st.write(f"**Backup JSON:** {os.path.basename(backup_resultado['json_backup'])}")
     
     except Exception as e:
-        st.error(f"Erro ao salvar resposta: {e}")
-        # Tentar salvar pelo menos no arquivo de emergência
-        salvar_backup_csv_emergencia(resposta)
+        print(f"Erro no diário de respostas: {e}")
+        # Sem o diário, grava direto no banco
+        try:
+            with conexao() as conn:
+                inseridas = inserir_lote(conn, [registro])
+            if inseridas:
+                obter_agendador().notificar()
+            st.success("✅ Resposta enviada com sucesso!")
+            st.balloons()
+        except Exception as e:
+            st.error(f"Erro ao salvar resposta: {e}")
 
-def salvar_backup_csv_emergencia(resposta):
-    """Salva resposta em CSV de emergência caso o banco falhe"""
+def _data_envio_utc(valor):
+    # O CSV de emergência guardava a hora local em ISO; respostas guarda UTC como CURRENT_TIMESTAMP
+    if not valor or 'T' not in valor:
+        return valor or None
     try:
-        timestamp = datetime.now().isoformat()
-        resposta_com_timestamp = {'timestamp': timestamp, **resposta}
-        
-        # Criar DataFrame
-        df = pd.DataFrame([resposta_com_timestamp])
-        
-        arquivo_emergencia = 'respostas_emergencia.csv'
-        
-        # Verificar se arquivo existe para append
-        if os.path.exists(arquivo_emergencia):
-            df.to_csv(arquivo_emergencia, mode='a', header=False, index=False)
-        else:
-            df.to_csv(arquivo_emergencia, index=False)
-            
-    except Exception as e:
-        print(f"Erro no backup de emergência: {e}")
+        return datetime.fromisoformat(valor).astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return valor
+
+def _id_submissao_legado(registro):
+    # Arquivos antigos não têm id de submissão: o hash do conteúdo é estável entre importações
+    conteudo = json.dumps([registro.get(c) for c in COLUNAS_RESPOSTA if c != 'id_submissao'], ensure_ascii=False)
+    return 'legado-' + hashlib.sha1(conteudo.encode('utf-8')).hexdigest()[:32]
+
+def _ler_arquivo_emergencia(caminho):
+    # Sem pandas: os valores chegam como texto ('018' continua '018') e sem o custo por linha
+    with open(caminho, 'r', newline='', encoding='utf-8') as f:
+        if not caminho.endswith('.jsonl'):
+            return list(csv.DictReader(f))
+        linhas = []
+        for texto in f:
+            if not texto.strip():
+                continue
+            try:
+                linhas.append(json.loads(texto))
+            except json.JSONDecodeError:
+                # Linha cortada por uma queda durante a gravação do diário
+                print(f"Linha ilegível ignorada em {caminho}: {texto[:80]!r}")
+        return linhas
+
+def importar_respostas_emergencia(caminho):
+    """Importa um arquivo de emergência (CSV antigo ou diário .jsonl) numa única transação.
+    
+    As colunas são ligadas por nome; envios já presentes no banco (mesmo id de
+    submissão) são ignorados, então importar o mesmo arquivo de novo não duplica nada.
+    """
+    inicio = time.perf_counter()
+    ignoradas = set()
+    registros = []
+    for linha in _ler_arquivo_emergencia(caminho):
+        registro = {}
+        for coluna, valor in linha.items():
+            coluna = MAPA_COLUNAS_EMERGENCIA.get(coluna, coluna)
+            if coluna in COLUNAS_RESPOSTA:
+                registro[coluna] = valor
+            else:
+                ignoradas.add(coluna)
+        # Célula vazia num campo numérico é ausência de resposta, não texto
+        if registro.get('percepcao_risco') == '':
+            registro['percepcao_risco'] = None
+        registro['data_envio'] = _data_envio_utc(registro.get('data_envio'))
+        if not registro.get('id_submissao'):
+            registro['id_submissao'] = _id_submissao_legado(registro)
+        registros.append(registro)
+    
+    with conexao() as conn:
+        inseridas = inserir_lote(conn, registros)
+    if inseridas:
+        obter_agendador().notificar(inseridas)
+    
+    segundos = time.perf_counter() - inicio
+    return {
+        'lidas': len(registros),
+        'inseridas': inseridas,
+        'duplicadas': len(registros) - inseridas,
+        'colunas_ignoradas': sorted(ignoradas),
+        'segundos': segundos,
+        'linhas_por_s': len(registros) / segundos if segundos else 0.0,
+    }
 
 def buscar_respostas():
     """Busca todas as respostas do SQLite"""
     try:
-        conn = sqlite3.connect('pesquisa_prep.db')
-        df = pd.read_sql("SELECT * FROM respostas", conn)
-        conn.close()
-        return df
+        with conexao() as conn:
+            return pd.read_sql("SELECT * FROM respostas", conn)
     except Exception as e:
         st.error(f"Erro ao buscar respostas: {e}")
         return pd.DataFrame()
+
+def contar_opcoes(campo):
+    """Quantas respostas marcaram cada opção de um campo de múltipla escolha ('barreiras', 'fonte_info').
+    
+    A contagem é um GROUP BY no índice da tabela de ligação, sem ler as respostas.
+    Devolve as colunas opcao e respostas, da opção mais marcada para a menos.
+    """
+    try:
+        garantir_esquema()
+        if preenchimento_pendente():
+            st.info("Respostas antigas ainda sendo indexadas: a contagem por opção está parcial.")
+        with conexao() as conn:
+            return pd.read_sql(f"SELECT opcao, COUNT(*) AS respostas FROM {CAMPOS_MULTIPLOS[campo]} "
+                               f"GROUP BY opcao ORDER BY respostas DESC, opcao", conn)
+    except Exception as e:
+        st.error(f"Erro ao contar opções de {campo}: {e}")
+        return pd.DataFrame(columns=['opcao', 'respostas'])
@@ -0,0 +1,262 @@
+# diario_respostas.py
+# Diário de envios: cada resposta é gravada primeiro num arquivo JSON Lines só de acréscimo
+# (durável após o fsync) e uma thread a repassa ao SQLite em lotes, uma transação por lote
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from conexao import BANCO_PATH, conexao
+from esquema import garantir_esquema
+
+try:
+    import fcntl
+except ImportError:
+    # Sem fcntl (Windows) não há trava entre processos; no processo a thread única já serializa
+    fcntl = None
+
+DIARIO_PATH = 'respostas_diario.jsonl'
+
+# Commit em grupo: a thread junta os envios que chegarem em até JANELA_LOTE_S
+# (no máximo MAX_LOTE) e faz um único fsync e uma única transação para todos
+MAX_LOTE = int(os.environ.get('PREP_DIARIO_MAX_LOTE', 500))
+JANELA_LOTE_S = float(os.environ.get('PREP_DIARIO_JANELA_MS', 5)) / 1000
+# Diário já todo repassado ao banco e maior que isto é arquivado e recomeçado
+MAX_BYTES_DIARIO = int(os.environ.get('PREP_DIARIO_MAX_MB', 64)) * 1024 * 1024
+# Bytes do diário lidos por transação ao repassar um atraso grande
+BYTES_POR_REPASSE = 4 * 1024 * 1024
+# Espera máxima de um envio pela gravação no diário
+TIMEOUT_ENVIO_S = 30
+
+# Colunas gravadas em respostas, na ordem do INSERT; o mapeamento é por nome, nunca por posição
+COLUNAS_RESPOSTA = (
+    'id_submissao', 'data_envio', 'idade', 'genero', 'orientacao_sexual', 'raca', 'escolaridade',
+    'renda', 'regiao', 'status_relacional', 'conhecimento_prep', 'uso_prep', 'objetivo_prep',
+    'acesso_servico', 'fonte_info', 'barreiras', 'percepcao_risco', 'efeitos_colaterais_teve',
+    'efeitos_colaterais_quais', 'comentarios',
+)
+
+_SQL_INSERIR = (
+    f"INSERT OR IGNORE INTO respostas ({', '.join(COLUNAS_RESPOSTA)}) VALUES ("
+    # Sem data_envio (registros antigos) vale o padrão da tabela
+    + ', '.join('COALESCE(?, CURRENT_TIMESTAMP)' if c == 'data_envio' else '?' for c in COLUNAS_RESPOSTA)
+    + ")"
+)
+
+_SQL_CHECKPOINT = """
+    INSERT INTO diario_checkpoint (arquivo, inode, posicao) VALUES (?, ?, ?)
+    ON CONFLICT(arquivo) DO UPDATE SET inode = excluded.inode, posicao = excluded.posicao
+"""
+
+def inserir_lote(conn, registros):
+    """Insere respostas (dicts) na transação de 'conn'; id_submissao já gravado é ignorado.
+
+    Devolve quantas foram de fato inseridas.
+    """
+    # rowcount soma só as linhas de respostas; total_changes contaria também as dos gatilhos
+    return conn.executemany(_SQL_INSERIR, [tuple(r.get(c) for c in COLUNAS_RESPOSTA) for r in registros]).rowcount
+
+def novo_registro(resposta):
+    """Resposta com id de submissão e data de envio (UTC, no formato do CURRENT_TIMESTAMP)"""
+    return {
+        'id_submissao': uuid.uuid4().hex,
+        'data_envio': datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+        **resposta,
+    }
+
+def _abrir_travado(caminho):
+    # Outro processo pode arquivar o diário entre o open e o flock: confere o inode
+    while True:
+        fd = os.open(caminho, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        if fcntl is None:
+            return fd
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_ino == os.stat(caminho).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+
+@contextmanager
+def diario_travado(caminho=DIARIO_PATH):
+    """Impede novas linhas no diário, em todos os processos, durante o bloco; devolve o os.stat do diário"""
+    fd = _abrir_travado(caminho)
+    try:
+        yield os.fstat(fd)
+    finally:
+        os.close(fd)
+
+def marcar_repassado(conn, info, caminho=DIARIO_PATH):
+    """Registra em 'conn' o diário inteiro (até info.st_size) como já repassado ao banco"""
+    conn.execute(_SQL_CHECKPOINT, (os.path.abspath(caminho), info.st_ino, info.st_size))
+
+class _Envio:
+    __slots__ = ('linha', 'gravado', 'erro')
+
+    def __init__(self, linha):
+        self.linha = linha
+        self.gravado = threading.Event()
+        self.erro = None
+
+class DiarioRespostas:
+    """Grava os envios no diário e os repassa ao banco numa thread separada.
+
+    registrar() só retorna depois do fsync: a partir daí a resposta sobrevive
+    a uma queda do processo e será inserida no banco, agora ou na próxima
+    inicialização, que retoma o diário do ponto salvo em diario_checkpoint.
+    """
+    def __init__(self, caminho=DIARIO_PATH, db_path=BANCO_PATH, ao_repassar=None):
+        self.caminho = caminho
+        self.db_path = db_path
+        # ao_repassar(n) é chamado após cada lote inserido no banco
+        self.ao_repassar = ao_repassar
+        self._fila = queue.Queue()
+        self._parar = False
+        self._ultimo_erro_repasse = None
+        self._thread = threading.Thread(target=self._executar, name='diario-respostas', daemon=True)
+        self._thread.start()
+        atexit.register(self.parar)
+
+    def registrar(self, registro):
+        """Grava no diário um registro de novo_registro() e devolve seu id de submissão.
+
+        Com TimeoutError o envio continua na fila e ainda pode ser gravado: quem
+        insere o mesmo registro por outro caminho deve reaproveitar o id_submissao.
+        """
+        envio = _Envio((json.dumps(registro, ensure_ascii=False) + '\n').encode('utf-8'))
+        self._fila.put(envio)
+        if not envio.gravado.wait(TIMEOUT_ENVIO_S):
+            raise TimeoutError("diário de respostas não respondeu")
+        if envio.erro:
+            raise envio.erro
+        return registro['id_submissao']
+
+    def _executar(self):
+        # A primeira passada retoma o que ficou no diário sem ir para o banco
+        self._repassar()
+        while not self._parar or not self._fila.empty():
+            try:
+                lote = [self._fila.get(timeout=1)]
+            except queue.Empty:
+                # Ocioso: tenta de novo um repasse que tenha falhado
+                if self._ultimo_erro_repasse:
+                    self._repassar()
+                continue
+            limite = time.monotonic() + JANELA_LOTE_S
+            while len(lote) < MAX_LOTE:
+                try:
+                    lote.append(self._fila.get(timeout=max(0, limite - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._gravar(b''.join(envio.linha for envio in lote))
+            except Exception as e:
+                print(f"Erro ao gravar o diário de respostas: {e}")
+                for envio in lote:
+                    envio.erro = e
+            for envio in lote:
+                envio.gravado.set()
+            self._repassar()
+
+    def _gravar(self, dados):
+        """Acrescenta as linhas ao diário com um único write e um único fsync"""
+        fd = _abrir_travado(self.caminho)
+        try:
+            tamanho = os.fstat(fd).st_size
+            # Uma gravação cortada por queda deixa a última linha sem '\n': fecha-a antes
+            if tamanho and os.pread(fd, 1, tamanho - 1) != b'\n':
+                dados = b'\n' + dados
+            os.write(fd, dados)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _repassar(self):
+        """Insere no banco as linhas do diário posteriores ao checkpoint, uma transação por bloco"""
+        try:
+            while True:
+                inseridas, fim = self._repassar_bloco()
+                if inseridas and self.ao_repassar:
+                    self.ao_repassar(inseridas)
+                if fim:
+                    break
+            self._ultimo_erro_repasse = None
+        except Exception as e:
+            # As respostas continuam no diário; nova tentativa no próximo lote ou em 1 s
+            if str(e) != self._ultimo_erro_repasse:
+                print(f"Erro ao repassar o diário ao banco: {e}")
+            self._ultimo_erro_repasse = str(e)
+
+    def _repassar_bloco(self):
+        try:
+            info = os.stat(self.caminho)
+        except FileNotFoundError:
+            return 0, True
+        chave = os.path.abspath(self.caminho)
+        # Um envio pode chegar antes de o app preparar o banco
+        garantir_esquema(self.db_path)
+        with conexao(self.db_path) as conn:
+            linha = conn.execute("SELECT inode, posicao FROM diario_checkpoint WHERE arquivo = ?",
+                                 (chave,)).fetchone()
+            # Inode diferente: o diário foi arquivado e este é um arquivo novo
+            posicao = linha[1] if linha and linha[0] == info.st_ino else 0
+            if posicao >= info.st_size:
+                if info.st_size >= MAX_BYTES_DIARIO:
+                    self._arquivar(info.st_size)
+                return 0, True
+
+            with open(self.caminho, 'rb') as f:
+                f.seek(posicao)
+                dados = f.read(min(info.st_size - posicao, BYTES_POR_REPASSE))
+            # Só linhas completas; o resto fica para o próximo bloco
+            completas = dados[:dados.rfind(b'\n') + 1]
+            if not completas:
+                return 0, True
+            registros = []
+            for texto in completas.splitlines():
+                if not texto.strip():
+                    continue
+                try:
+                    registros.append(json.loads(texto))
+                except json.JSONDecodeError:
+                    print(f"Linha ilegível no diário de respostas ignorada: {texto[:80]!r}")
+            inseridas = inserir_lote(conn, registros)
+            # O checkpoint avança na mesma transação das inserções
+            conn.execute(_SQL_CHECKPOINT, (chave, info.st_ino, posicao + len(completas)))
+        return inseridas, posicao + len(completas) >= info.st_size
+
+    def _arquivar(self, repassado):
+        """Renomeia o diário já todo repassado; o próximo envio cria um arquivo novo"""
+        fd = _abrir_travado(self.caminho)
+        try:
+            # Só se ninguém acrescentou linhas depois da leitura do checkpoint
+            if os.fstat(fd).st_size == repassado:
+                base, extensao = os.path.splitext(self.caminho)
+                os.replace(self.caminho, f"{base}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}{extensao}")
+        finally:
+            os.close(fd)
+
+    def pendentes(self):
+        """Envios aguardando gravação no diário"""
+        return self._fila.qsize()
+
+    def parar(self):
+        """Grava e repassa o que estiver na fila e encerra a thread"""
+        self._parar = True
+        self._thread.join(timeout=10)
+
+_diario = None
+_trava_diario = threading.Lock()
+
+def obter_diario(ao_repassar=None):
+    """Diário único do processo, criado no primeiro uso"""
+    global _diario
+    with _trava_diario:
+        if _diario is None:
+            _diario = DiarioRespostas(ao_repassar=ao_repassar)
+        return _diario
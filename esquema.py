@@ -0,0 +1,223 @@
+# esquema.py
+# Esquema versionado do banco da pesquisa: migrações numeradas, aplicadas uma única vez
+# e registradas no próprio banco (PRAGMA user_version)
+import os
+import threading
+import time
+from conexao import BANCO_PATH, conexao
+
+# Colunas atuais de respostas; bancos da versão antiga do app (.streamlit/database.py)
+# não têm status_relacional nem objetivo_prep
+COLUNAS_RESPOSTAS = {
+    'idade': 'TEXT',
+    'genero': 'TEXT',
+    'orientacao_sexual': 'TEXT',
+    'raca': 'TEXT',
+    'escolaridade': 'TEXT',
+    'renda': 'TEXT',
+    'regiao': 'TEXT',
+    'status_relacional': 'TEXT',
+    'conhecimento_prep': 'TEXT',
+    'uso_prep': 'TEXT',
+    'objetivo_prep': 'TEXT',
+    'acesso_servico': 'TEXT',
+    'fonte_info': 'TEXT',
+    'barreiras': 'TEXT',
+    'percepcao_risco': 'INTEGER',
+    'efeitos_colaterais_teve': 'TEXT',
+    'efeitos_colaterais_quais': 'TEXT',
+    'comentarios': 'TEXT',
+}
+
+def _colunas(conn, tabela):
+    return {linha[1] for linha in conn.execute(f"PRAGMA table_info({tabela})")}
+
+def _v1_respostas(conn):
+    colunas = ',\n'.join(f"{nome} {tipo}" for nome, tipo in COLUNAS_RESPOSTAS.items())
+    conn.execute(f'''
+    CREATE TABLE IF NOT EXISTS respostas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data_envio TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        {colunas}
+    )
+    ''')
+    existentes = _colunas(conn, 'respostas')
+    for nome, tipo in COLUNAS_RESPOSTAS.items():
+        if nome not in existentes:
+            conn.execute(f"ALTER TABLE respostas ADD COLUMN {nome} {tipo}")
+
+def _v2_id_submissao(conn):
+    if 'id_submissao' not in _colunas(conn, 'respostas'):
+        conn.execute("ALTER TABLE respostas ADD COLUMN id_submissao TEXT")
+    # Um envio repassado duas vezes (retomada do diário, importação repetida) é ignorado
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_respostas_id_submissao ON respostas (id_submissao)")
+
+def _v3_diario_checkpoint(conn):
+    # Até onde o diário de envios já foi repassado ao banco (diario_respostas.py)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS diario_checkpoint (
+            arquivo TEXT PRIMARY KEY,
+            inode INTEGER NOT NULL,
+            posicao INTEGER NOT NULL
+        )
+    """)
+
+# Respostas de múltipla escolha, gravadas em respostas como texto unido por ", ",
+# e a tabela de ligação (resposta, opção) de cada uma
+CAMPOS_MULTIPLOS = {'barreiras': 'resposta_barreiras', 'fonte_info': 'resposta_fonte_info'}
+# Faixa de ids preenchida por transação ao popular as tabelas de ligação, e a pausa
+# entre as faixas, em que os envios esperando a trava de escrita conseguem gravar
+LOTE_PREENCHIMENTO = 5000
+PAUSA_PREENCHIMENTO_S = 0.05
+
+def _lista_opcoes(coluna):
+    """Expressão SQL com o texto 'coluna' como array JSON das opções, para json_each.
+
+    As vírgulas viram '","'; aspas, barras e quebras de linha são tratadas antes.
+    Um texto que ainda assim não forme JSON válido vira '[]' (nenhuma opção), em
+    vez de fazer a gravação da resposta falhar.
+    """
+    texto = f"replace(replace(replace(COALESCE({coluna}, ''), char(13), ' '), char(10), ' '), char(9), ' ')"
+    escapado = f"replace(replace({texto}, '\\', '\\\\'), '\"', '\\\"')"
+    lista = f"""'["' || replace({escapado}, ',', '","') || '"]'"""
+    return f"CASE WHEN json_valid({lista}) THEN {lista} ELSE '[]' END"
+
+def _v4_opcoes_multiplas(conn):
+    for campo, tabela in CAMPOS_MULTIPLOS.items():
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {tabela} (
+                resposta_id INTEGER NOT NULL,
+                opcao TEXT NOT NULL,
+                PRIMARY KEY (resposta_id, opcao)
+            )
+        """)
+        # Contagem por opção: GROUP BY lendo só o índice
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabela}_opcao ON {tabela} (opcao)")
+        # Os gatilhos mantêm a ligação na mesma transação de qualquer gravação em respostas
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {tabela}_ai AFTER INSERT ON respostas BEGIN
+                INSERT OR IGNORE INTO {tabela} (resposta_id, opcao)
+                SELECT NEW.id, trim(value) FROM json_each({_lista_opcoes(f'NEW.{campo}')})
+                WHERE trim(value) != '';
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {tabela}_au AFTER UPDATE OF {campo} ON respostas BEGIN
+                DELETE FROM {tabela} WHERE resposta_id = OLD.id;
+                INSERT OR IGNORE INTO {tabela} (resposta_id, opcao)
+                SELECT NEW.id, trim(value) FROM json_each({_lista_opcoes(f'NEW.{campo}')})
+                WHERE trim(value) != '';
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {tabela}_ad AFTER DELETE ON respostas BEGIN
+                DELETE FROM {tabela} WHERE resposta_id = OLD.id;
+            END
+        """)
+    # As respostas já gravadas são ligadas aos poucos por _preencher_pendentes
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS preenchimentos (
+            nome TEXT PRIMARY KEY,
+            proximo_id INTEGER NOT NULL,
+            ate_id INTEGER NOT NULL
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO preenchimentos SELECT 'opcoes_multiplas', 1, COALESCE(MAX(id), 0) FROM respostas")
+
+# A migração N leva o banco da versão N-1 para a N; só se acrescenta ao fim da lista
+MIGRACOES = [_v1_respostas, _v2_id_submissao, _v3_diario_checkpoint, _v4_opcoes_multiplas]
+VERSAO_ESQUEMA = len(MIGRACOES)
+
+_SQL_PREENCHIMENTO_PENDENTE = ("SELECT proximo_id, ate_id FROM preenchimentos "
+                               "WHERE nome = 'opcoes_multiplas' AND proximo_id <= ate_id")
+
+def preenchimento_pendente(caminho=BANCO_PATH):
+    """Se ainda há respostas antigas sem ligação nas tabelas de opções (contagens parciais)"""
+    with conexao(caminho) as conn:
+        return conn.execute(_SQL_PREENCHIMENTO_PENDENTE).fetchone() is not None
+
+def _preencher_pendentes(caminho):
+    """Liga as respostas anteriores à migração 4 às suas opções, uma faixa de ids por transação.
+
+    Interrompido, recomeça da faixa seguinte à última confirmada; as respostas
+    novas já chegam ligadas pelos gatilhos.
+    """
+    while True:
+        with conexao(caminho) as conn:
+            # Trava de escrita antes de ler a faixa: outro processo pode estar preenchendo
+            conn.execute("BEGIN IMMEDIATE")
+            linha = conn.execute(_SQL_PREENCHIMENTO_PENDENTE).fetchone()
+            if linha is None:
+                return
+            de_id, ate_id = linha[0], min(linha[0] + LOTE_PREENCHIMENTO - 1, linha[1])
+            for campo, tabela in CAMPOS_MULTIPLOS.items():
+                conn.execute(f"""
+                    INSERT OR IGNORE INTO {tabela} (resposta_id, opcao)
+                    SELECT r.id, trim(opcoes.value) FROM respostas AS r, json_each({_lista_opcoes(f'r.{campo}')}) AS opcoes
+                    WHERE r.id BETWEEN ? AND ? AND trim(opcoes.value) != ''
+                """, (de_id, ate_id))
+            conn.execute("UPDATE preenchimentos SET proximo_id = ? WHERE nome = 'opcoes_multiplas'", (ate_id + 1,))
+        time.sleep(PAUSA_PREENCHIMENTO_S)
+
+_preparados = set()
+_trava = threading.Lock()
+_preenchendo = set()
+
+def _iniciar_preenchimento(caminho, chave):
+    # Numa thread: o preenchimento cresce com o banco e não pode segurar a primeira página
+    if chave in _preenchendo:
+        return
+    _preenchendo.add(chave)
+
+    def executar():
+        try:
+            _preencher_pendentes(caminho)
+        except Exception as e:
+            # Retomado do ponto salvo na próxima inicialização (ou restauração de backup)
+            print(f"Erro ao preencher as tabelas de opções: {e}")
+        finally:
+            _preenchendo.discard(chave)
+
+    threading.Thread(target=executar, name='preenchimento-opcoes', daemon=True).start()
+
+def versao_banco(caminho=BANCO_PATH):
+    with conexao(caminho) as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def aplicar_migracoes(conn):
+    """Aplica as migrações pendentes na transação de 'conn' (confirmada por quem chama)"""
+    if conn.execute("PRAGMA user_version").fetchone()[0] < VERSAO_ESQUEMA:
+        # Trava de escrita antes de reler a versão: outro processo pode estar migrando
+        conn.execute("BEGIN IMMEDIATE")
+        versao = conn.execute("PRAGMA user_version").fetchone()[0]
+        for numero, migracao in enumerate(MIGRACOES[versao:], start=versao + 1):
+            migracao(conn)
+            conn.execute(f"PRAGMA user_version = {numero}")
+
+def garantir_esquema(caminho=BANCO_PATH, forcar=False):
+    """Aplica as migrações pendentes do banco.
+
+    Depois da primeira chamada no processo não toca mais no banco; 'forcar'
+    confere a versão de novo (após restaurar um backup, por exemplo). As
+    respostas antigas são ligadas às tabelas de opções numa thread separada
+    (ou de uma vez com: python esquema.py).
+    """
+    chave = (os.getpid(), os.path.abspath(caminho))
+    if chave in _preparados and not forcar:
+        return
+    with _trava:
+        if chave in _preparados and not forcar:
+            return
+        with conexao(caminho) as conn:
+            aplicar_migracoes(conn)
+            pendente = conn.execute(_SQL_PREENCHIMENTO_PENDENTE).fetchone() is not None
+        if pendente:
+            _iniciar_preenchimento(caminho, chave)
+        _preparados.add(chave)
+
+if __name__ == "__main__":
+    # Migra e preenche as tabelas de opções de uma vez, antes de subir o app
+    with conexao() as conn:
+        aplicar_migracoes(conn)
+    _preencher_pendentes(BANCO_PATH)
+    print(f"{BANCO_PATH}: esquema na versão {versao_banco()}, tabelas de opções preenchidas")
@@ -0,0 +1,42 @@
+# graficos.py
+# Gráficos montados sempre a partir de tabelas (categoria, contagem) agregadas no servidor
+import logging
+import plotly.express as px
+import streamlit as st
+from streamlit.logger import get_logger
+
+logger = get_logger(__name__)
+
+def tabela_contagem(dados, coluna, normalizar=False):
+    """Reduz uma coluna a uma tabela (categoria, contagem) ou (categoria, percentual)"""
+    valor = 'percentual' if normalizar else 'contagem'
+    tabela = dados[coluna].value_counts(normalize=normalizar).reset_index()
+    tabela.columns = [coluna, valor]
+    return tabela
+
+def _agregar(dados, categoria, valores):
+    # Dados brutos (sem coluna de valores) são reduzidos antes de virar figura
+    if valores is None:
+        return tabela_contagem(dados, categoria), 'contagem'
+    return dados, valores
+
+def grafico_pizza(dados, nomes, valores=None, titulo=None, **kwargs):
+    tabela, valores = _agregar(dados, nomes, valores)
+    return px.pie(tabela, names=nomes, values=valores, title=titulo, **kwargs)
+
+def grafico_barras(dados, x, y=None, titulo=None, **kwargs):
+    tabela, y = _agregar(dados, x, y)
+    return px.bar(tabela, x=x, y=y, title=titulo, **kwargs)
+
+def grafico_linha(tabela, x, y, titulo=None, **kwargs):
+    return px.line(tabela, x=x, y=y, title=titulo, **kwargs)
+
+def grafico_calor(matriz, titulo=None, **kwargs):
+    return px.imshow(matriz, title=titulo, aspect='auto', **kwargs)
+
+def exibir_grafico(fig):
+    """Exibe a figura; com log em DEBUG, registra o tamanho do JSON enviado ao navegador"""
+    # Medir exige serializar a figura uma vez a mais, então só é feito quando o log será emitido
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Gráfico '%s': %.1f KB", fig.layout.title.text or 'sem título', len(fig.to_json()) / 1024)
+    st.plotly_chart(fig, use_container_width=True)
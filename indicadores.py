@@ -0,0 +1,103 @@
+# indicadores.py
+# Conversão da planilha indicadoresAids.xls para um formato tidy (planilha, indicador, ano, valor)
+import json
+import os
+import pandas as pd
+from dados_publicos import DATA_PATH, CACHE_PATH, assinatura_arquivo, fonte_inalterada, gravacao_atomica, trava_reconstrucao
+
+PLANILHA_INDICADORES = DATA_PATH / 'indicadoresAids.xls'
+INDICADORES_PATH = CACHE_PATH / 'indicadores.parquet'
+MANIFESTO_INDICADORES_PATH = CACHE_PATH / 'indicadores.json'
+
+ANO_MINIMO, ANO_MAXIMO = 1980, 2100
+
+def _ano(valor):
+    try:
+        ano = int(float(str(valor).strip()))
+    except ValueError:
+        return None
+    return ano if ANO_MINIMO <= ano <= ANO_MAXIMO and float(str(valor).strip()) == ano else None
+
+def _numero(valor):
+    # Células de texto seguem o padrão brasileiro: 1.234,5 ; '-' ou '...' sem dado
+    if isinstance(valor, str):
+        valor = valor.strip().replace('.', '').replace(',', '.')
+    return pd.to_numeric(valor, errors='coerce')
+
+def _planilha_tidy(nome_planilha, bruto):
+    """Localiza a linha de anos da planilha e transforma as linhas de indicadores em formato longo"""
+    for linha_cabecalho in range(len(bruto)):
+        anos = {col: _ano(v) for col, v in bruto.iloc[linha_cabecalho].items() if pd.notna(v)}
+        anos = {col: ano for col, ano in anos.items() if ano is not None}
+        if len(anos) >= 3:
+            break
+    else:
+        return pd.DataFrame()
+
+    primeira_coluna_ano = min(anos)
+    colunas_rotulo = [c for c in bruto.columns if c < primeira_coluna_ano]
+    corpo = bruto.iloc[linha_cabecalho + 1:]
+
+    # Rótulo do indicador: textos à esquerda da primeira coluna de ano
+    rotulos = corpo[colunas_rotulo].apply(
+        lambda linha: ' - '.join(str(v).strip() for v in linha if pd.notna(v) and str(v).strip()), axis=1)
+    valores = corpo[list(anos)].apply(lambda coluna: coluna.map(_numero))
+    valores.columns = list(anos.values())
+    valores['indicador'] = rotulos
+    valores = valores[valores['indicador'] != '']
+
+    tidy = valores.melt(id_vars='indicador', var_name='ano', value_name='valor').dropna(subset=['valor'])
+    tidy.insert(0, 'planilha', nome_planilha)
+    return tidy
+
+def converter_indicadores():
+    """Lê a planilha uma única vez e grava a versão tidy e tipada no cache"""
+    assinatura = assinatura_arquivo(PLANILHA_INDICADORES)
+    planilhas = pd.read_excel(PLANILHA_INDICADORES, sheet_name=None, header=None, dtype=object)
+    partes = [_planilha_tidy(nome, bruto) for nome, bruto in planilhas.items()]
+    partes = [parte for parte in partes if not parte.empty]
+    if partes:
+        df = pd.concat(partes, ignore_index=True)
+    else:
+        df = pd.DataFrame(columns=['planilha', 'indicador', 'ano', 'valor'])
+    df = df.astype({'planilha': 'category', 'indicador': 'category', 'ano': 'int16', 'valor': 'float64'})
+
+    with gravacao_atomica(INDICADORES_PATH) as tmp_path:
+        df.to_parquet(tmp_path, index=False)
+    with gravacao_atomica(MANIFESTO_INDICADORES_PATH) as tmp_path:
+        with open(tmp_path, 'w') as f:
+            json.dump({'fonte': assinatura, 'linhas': len(df)}, f, indent=2)
+    return df
+
+def _cache_indicadores_valido():
+    try:
+        with open(MANIFESTO_INDICADORES_PATH, 'r') as f:
+            manifesto = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+    mtime_anterior = manifesto['fonte']['mtime_ns']
+    if not INDICADORES_PATH.exists() or not fonte_inalterada(PLANILHA_INDICADORES, manifesto['fonte']):
+        return False
+    if manifesto['fonte']['mtime_ns'] != mtime_anterior:
+        with open(MANIFESTO_INDICADORES_PATH, 'w') as f:
+            json.dump(manifesto, f, indent=2)
+    return True
+
+def carregar_indicadores():
+    """Indicadores em formato tidy, convertendo a planilha só quando ela mudar"""
+    if not PLANILHA_INDICADORES.exists():
+        raise FileNotFoundError(PLANILHA_INDICADORES)
+    if _cache_indicadores_valido():
+        return pd.read_parquet(INDICADORES_PATH)
+    with trava_reconstrucao('indicadores'):
+        if _cache_indicadores_valido():
+            return pd.read_parquet(INDICADORES_PATH)
+        return converter_indicadores()
+
+def versao_indicadores():
+    info = os.stat(PLANILHA_INDICADORES)
+    return (info.st_size, info.st_mtime_ns)
+
+if __name__ == "__main__":
+    df = converter_indicadores()
+    print(f"{len(df)} valores de {df['indicador'].nunique()} indicadores em {df['planilha'].nunique()} planilhas")
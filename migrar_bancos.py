@@ -0,0 +1,221 @@
+# migrar_bancos.py
+# Migra as respostas dos bancos antigos (pesquisa_prep.db e o layout de .streamlit/database.py)
+# para o esquema de data/prep_research.db, em lotes e sem carregar a tabela na memória
+#
+# Uso: python migrar_bancos.py [--origem pesquisa_prep.db ...] [--destino data/prep_research.db] [--lote 5000]
+# Cada lote é gravado numa transação junto com o checkpoint em 'execucoes': interrompida,
+# a migração recomeça do último lote confirmado; rodada de novo, copia só as respostas novas.
+import argparse
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from conexao import BUSY_TIMEOUT_MS
+
+DESTINO_PATH = os.path.join('data', 'prep_research.db')
+LOTE_PADRAO = 5000
+
+# Coluna de origem -> coluna de destino de cada pergunta, por versão do formulário;
+# None: pergunta sem coluna no destino (seus valores entram no relatório do que fica para trás).
+# v1: layout de .streamlit/database.py; v2: layout atual, que acrescenta status_relacional e objetivo_prep
+_MAPA_V1 = {
+    'data_envio': 'ts_utc',
+    'idade': 'faixa_etaria',
+    'genero': 'genero',
+    'orientacao_sexual': 'orientacao_sexual',
+    'raca': 'raca',
+    'escolaridade': 'escolaridade',
+    'renda': 'renda',
+    'regiao': 'regiao',
+    'conhecimento_prep': 'conhecimento_prep',
+    'uso_prep': 'uso_preppep',
+    'acesso_servico': 'acesso_servicos',
+    'fonte_info': 'fonte_informacao',
+    'barreiras': None,
+    'percepcao_risco': None,
+    'efeitos_colaterais_teve': None,
+    'efeitos_colaterais_quais': None,
+    'comentarios': 'comentarios',
+}
+MAPEAMENTOS = {
+    'v1': _MAPA_V1,
+    'v2': {**_MAPA_V1, 'status_relacional': None, 'objetivo_prep': None},
+}
+# Colunas da origem que não são dados da resposta
+COLUNAS_INTERNAS = {'id', 'id_submissao'}
+
+@contextmanager
+def _conexao_destino(caminho):
+    # Conexão própria, sem o pool do app: os PRAGMAs do pool deixariam o banco
+    # versionado em modo WAL de vez. Confirma ao sair do bloco, como conexao()
+    conn = sqlite3.connect(caminho, timeout=BUSY_TIMEOUT_MS / 1000)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+def _colunas(conn, tabela='respostas'):
+    return [linha[1] for linha in conn.execute(f"PRAGMA table_info({tabela})")]
+
+def versao_form(colunas):
+    """Versão do formulário de um banco de origem: a mais recente cujas perguntas estão todas nas colunas"""
+    for versao in reversed(MAPEAMENTOS):
+        if set(MAPEAMENTOS[versao]) <= set(colunas):
+            return versao
+    return 'v1'
+
+def _ts_utc(valor):
+    # CURRENT_TIMESTAMP grava 'AAAA-MM-DD HH:MM:SS' em UTC; o destino usa ISO 8601 com 'Z'
+    if valor is None:
+        return ''
+    valor = str(valor)
+    if len(valor) == 19 and valor[10] == ' ':
+        return f"{valor[:10]}T{valor[11:]}Z"
+    return valor
+
+def _agora_utc():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def _registrar(conn, acao, detalhes):
+    conn.execute("INSERT INTO execucoes (ts_utc, acao, detalhes) VALUES (?, ?, ?)",
+                 (_agora_utc(), acao, json.dumps(detalhes, ensure_ascii=False)))
+
+def ultimo_checkpoint(conn, origem):
+    """Maior id de origem já migrado (0 se a origem nunca foi migrada)"""
+    linha = conn.execute("""
+        SELECT json_extract(detalhes, '$.ultimo_id') FROM execucoes
+        WHERE acao = 'migracao_lote' AND json_extract(detalhes, '$.origem') = ?
+        ORDER BY id DESC LIMIT 1
+    """, (origem,)).fetchone()
+    return linha[0] if linha else 0
+
+def planejar(colunas_origem, colunas_destino, preservar_extras=False):
+    """Mapeamento efetivo da origem para o destino e as colunas que ficariam sem destino"""
+    versao = versao_form(colunas_origem)
+    mapa = {o: d for o, d in MAPEAMENTOS[versao].items() if d and o in colunas_origem and d in colunas_destino}
+    sem_destino = [c for c in colunas_origem if c not in mapa and c not in COLUNAS_INTERNAS]
+    if preservar_extras:
+        mapa.update({c: c for c in sem_destino})
+        sem_destino = []
+    return versao, mapa, sem_destino
+
+def migrar(origem, destino=DESTINO_PATH, lote=LOTE_PADRAO, preservar_extras=False, progresso=print):
+    """Copia para 'destino' as respostas de 'origem' posteriores ao último checkpoint.
+
+    A origem é aberta só para leitura e cada lote é uma leitura curta por
+    faixa de id: o app pode continuar gravando nela durante a migração.
+    """
+    chave = os.path.abspath(origem)
+    leitor = sqlite3.connect(f"file:{origem}?mode=ro", uri=True)
+    try:
+        colunas_origem = _colunas(leitor)
+        if not colunas_origem:
+            raise ValueError(f"{origem} não tem a tabela respostas")
+
+        with _conexao_destino(destino) as conn:
+            colunas_destino = _colunas(conn)
+            versao, mapa, sem_destino = planejar(colunas_origem, colunas_destino, preservar_extras)
+            if preservar_extras:
+                for coluna in mapa:
+                    if mapa[coluna] not in colunas_destino:
+                        conn.execute(f"ALTER TABLE respostas ADD COLUMN {coluna} TEXT")
+            ultimo_id = ultimo_checkpoint(conn, chave)
+            _registrar(conn, 'migracao_inicio', {'origem': chave, 'versao_form': versao, 'desde_id': ultimo_id,
+                                                 'mapeamento': mapa, 'sem_destino': sem_destino})
+
+        copiadas = list(mapa)
+        # As colunas sem destino também são lidas, só para contar os valores que ficam para trás
+        selecao = ', '.join(['id'] + copiadas + sem_destino)
+        destinos = ['versao_form'] + [mapa[c] for c in copiadas]
+        if 'data_envio' not in mapa:
+            destinos.append('ts_utc')
+        inserir = (f"INSERT INTO respostas ({', '.join(destinos)}) "
+                   f"VALUES ({', '.join('?' * len(destinos))})")
+        posicao_data = copiadas.index('data_envio') if 'data_envio' in mapa else None
+        n = len(copiadas)
+        perdidos = dict.fromkeys(sem_destino, 0)
+
+        total = 0
+        inicio = time.perf_counter()
+        while True:
+            linhas = leitor.execute(f"SELECT {selecao} FROM respostas WHERE id > ? ORDER BY id LIMIT ?",
+                                    (ultimo_id, lote)).fetchall()
+            if not linhas:
+                break
+            registros = []
+            for linha in linhas:
+                valores = list(linha[1:n + 1])
+                if posicao_data is None:
+                    valores.append('')
+                else:
+                    valores[posicao_data] = _ts_utc(valores[posicao_data])
+                registros.append((versao, *valores))
+                for coluna, valor in zip(sem_destino, linha[n + 1:]):
+                    if valor is not None and valor != '':
+                        perdidos[coluna] += 1
+            de_id, ate_id = linhas[0][0], linhas[-1][0]
+            # Lote e checkpoint na mesma transação
+            with _conexao_destino(destino) as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                if ultimo_checkpoint(conn, chave) != ultimo_id:
+                    raise RuntimeError(f"outra migração de {origem} está em andamento")
+                conn.executemany(inserir, registros)
+                _registrar(conn, 'migracao_lote', {'origem': chave, 'versao_form': versao,
+                                                   'de_id': de_id, 'ultimo_id': ate_id, 'linhas': len(linhas)})
+            ultimo_id = ate_id
+            total += len(linhas)
+            segundos = time.perf_counter() - inicio
+            progresso(f"{os.path.basename(origem)}: {total} respostas até o id {ate_id} "
+                      f"({total / segundos:,.0f} linhas/s)")
+
+        relatorio = {
+            'origem': chave,
+            'versao_form': versao,
+            'migradas': total,
+            'ultimo_id': ultimo_id,
+            'segundos': time.perf_counter() - inicio,
+            'sem_destino': perdidos,
+        }
+        with _conexao_destino(destino) as conn:
+            _registrar(conn, 'migracao_fim', relatorio)
+        return relatorio
+    finally:
+        leitor.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra respostas dos bancos antigos para data/prep_research.db")
+    parser.add_argument('--origem', nargs='+', default=['pesquisa_prep.db'])
+    parser.add_argument('--destino', default=DESTINO_PATH)
+    parser.add_argument('--lote', type=int, default=LOTE_PADRAO)
+    parser.add_argument('--preservar-extras', action='store_true',
+                        help="cria no destino as colunas da origem sem correspondência, em vez de descartá-las")
+    parser.add_argument('--planejar', action='store_true', help="só mostra o mapeamento, sem copiar nada")
+    args = parser.parse_args()
+
+    for origem in args.origem:
+        if args.planejar:
+            leitor = sqlite3.connect(f"file:{origem}?mode=ro", uri=True)
+            with _conexao_destino(args.destino) as conn:
+                colunas_destino = _colunas(conn)
+                desde = ultimo_checkpoint(conn, os.path.abspath(origem))
+            versao, mapa, sem_destino = planejar(_colunas(leitor), colunas_destino, args.preservar_extras)
+            leitor.close()
+            print(f"{origem} ({versao}, a partir do id {desde}):")
+            for o, d in mapa.items():
+                print(f"  {o:<26} -> {d}")
+            if sem_destino:
+                print(f"  sem destino: {', '.join(sem_destino)}")
+            continue
+        relatorio = migrar(origem, args.destino, args.lote, args.preservar_extras)
+        print(f"{origem}: {relatorio['migradas']} respostas migradas ({relatorio['versao_form']}) "
+              f"em {relatorio['segundos']:.1f} s")
+        perdidas = {c: n for c, n in relatorio['sem_destino'].items() if n}
+        if perdidas:
+            print("  Valores sem coluna no destino (use --preservar-extras para mantê-los): "
+                  + ', '.join(f"{c} ({n})" for c, n in perdidas.items()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# modelos.py
+# Treino offline do modelo de continuidade na PrEP (Disp_12m_2024) e cache versionado dos artefatos
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import roc_auc_score, log_loss
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import OneHotEncoder
+from cubo import carregar_cubo
+from dados_publicos import versao_dataset
+
+MODELOS_PATH = Path('modelos')
+
+# Incrementar quando mudarem as variáveis, o alvo ou o estimador
+VERSAO_MODELO = 1
+VARIAVEIS = ['UF_UDM', 'raca4_cat', 'fetar', 'escol4', 'Pop_genero_pratica']
+ALVO = 'Disp_12m_2024'
+VALORES_POSITIVOS = {'1', '1.0', 'sim', 's', 'true'}
+
+def _alvo_binario(valores):
+    return valores.astype(str).str.strip().str.lower().isin(VALORES_POSITIVOS).astype('int8')
+
+def _nome_artefato(versao_dados):
+    return f'retencao_v{VERSAO_MODELO}_{versao_dados}'
+
+def _dados_treino():
+    """Células do cubo com contagem de usuários que continuaram e que não continuaram.
+
+    Como todas as variáveis são categóricas, o cubo resume o conjunto de treino sem
+    perda: treinar com pesos = contagens equivale a treinar com todas as linhas,
+    com memória proporcional ao número de combinações e não ao de usuários.
+    """
+    cubo = carregar_cubo()
+    cubo = cubo.dropna(subset=[ALVO])
+    cubo = cubo.assign(**{ALVO: _alvo_binario(cubo[ALVO])})
+    celulas = cubo.groupby(VARIAVEIS + [ALVO], observed=True, dropna=False)['contagem'].sum().reset_index()
+    celulas[VARIAVEIS] = celulas[VARIAVEIS].astype(str)
+    return celulas[celulas['contagem'] > 0].reset_index(drop=True)
+
+def _separar(celulas, fracao_teste=0.2, semente=42):
+    # Divide a contagem de cada célula entre treino e teste (amostragem estratificada por célula)
+    rng = np.random.default_rng(semente)
+    teste = rng.binomial(celulas['contagem'].to_numpy(), fracao_teste)
+    treino = celulas.assign(contagem=celulas['contagem'] - teste)
+    teste = celulas.assign(contagem=teste)
+    return treino[treino['contagem'] > 0], teste[teste['contagem'] > 0]
+
+def treinar():
+    """Treina o modelo fora do Streamlit e grava o artefato versionado"""
+    versao_dados = versao_dataset('usuarios')
+    celulas = _dados_treino()
+    if celulas[ALVO].nunique() < 2:
+        raise ValueError("O alvo precisa ter as duas classes para treinar o modelo")
+    treino, teste = _separar(celulas)
+
+    modelo = make_pipeline(
+        OneHotEncoder(handle_unknown='ignore'),
+        LogisticRegression(max_iter=1000, class_weight='balanced')
+    )
+    modelo.fit(treino[VARIAVEIS], treino[ALVO], logisticregression__sample_weight=treino['contagem'])
+
+    probabilidades = modelo.predict_proba(teste[VARIAVEIS])[:, 1]
+    metricas = {
+        'auc': float(roc_auc_score(teste[ALVO], probabilidades, sample_weight=teste['contagem'])),
+        'log_loss': float(log_loss(teste[ALVO], probabilidades, sample_weight=teste['contagem'])),
+        'taxa_continuidade': float(np.average(celulas[ALVO], weights=celulas['contagem'])),
+        'usuarios_treino': int(treino['contagem'].sum()),
+        'usuarios_teste': int(teste['contagem'].sum()),
+    }
+
+    MODELOS_PATH.mkdir(parents=True, exist_ok=True)
+    nome = _nome_artefato(versao_dados)
+    joblib.dump(modelo, MODELOS_PATH / f'{nome}.joblib')
+
+    # Inferência em lote: uma previsão por combinação de variáveis observada
+    previsoes = celulas.groupby(VARIAVEIS, observed=True)['contagem'].sum().reset_index()
+    previsoes['prob_continuidade'] = modelo.predict_proba(previsoes[VARIAVEIS])[:, 1]
+    previsoes.to_parquet(MODELOS_PATH / f'{nome}_previsoes.parquet', index=False)
+
+    metadados = {
+        'versao_modelo': VERSAO_MODELO,
+        'versao_dados': versao_dados,
+        'variaveis': VARIAVEIS,
+        'alvo': ALVO,
+        'metricas': metricas,
+        'sklearn': sklearn.__version__,
+        'treinado_em': datetime.now().isoformat(),
+    }
+    # O JSON é gravado por último: só artefatos completos são encontrados
+    with open(MODELOS_PATH / f'{nome}.json', 'w') as f:
+        json.dump(metadados, f, indent=2)
+    return metadados
+
+def artefato_atual():
+    """Metadados do artefato mais recente; 'atualizado' indica se corresponde aos dados atuais"""
+    if not MODELOS_PATH.exists():
+        return None
+    candidatos = []
+    for caminho in MODELOS_PATH.glob(f'retencao_v{VERSAO_MODELO}_*.json'):
+        with open(caminho, 'r') as f:
+            candidatos.append(json.load(f))
+    if not candidatos:
+        return None
+    try:
+        versao_dados = versao_dataset('usuarios')
+    except FileNotFoundError:
+        versao_dados = None
+    atuais = [m for m in candidatos if m['versao_dados'] == versao_dados]
+    metadados = max(atuais or candidatos, key=lambda m: m['treinado_em'])
+    metadados['atualizado'] = bool(atuais)
+    return metadados
+
+def carregar_modelo(metadados):
+    nome = _nome_artefato(metadados['versao_dados'])
+    modelo = joblib.load(MODELOS_PATH / f'{nome}.joblib')
+    previsoes = pd.read_parquet(MODELOS_PATH / f'{nome}_previsoes.parquet')
+    return modelo, previsoes
+
+def coeficientes(modelo):
+    """Peso de cada categoria no modelo (log-odds em relação à média)"""
+    encoder = modelo.named_steps['onehotencoder']
+    regressao = modelo.named_steps['logisticregression']
+    nomes = encoder.get_feature_names_out(VARIAVEIS)
+    return pd.DataFrame({'variavel': nomes, 'peso': regressao.coef_[0]}).sort_values('peso', ascending=False)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != 'treinar':
+        print("Uso: python modelos.py treinar")
+        sys.exit(1)
+    metadados = treinar()
+    print(f"Modelo treinado: {json.dumps(metadados['metricas'], indent=2)}")
@@ -2,9 +2,9 @@
 # simular_respostas.py - Gera respostas aleatórias para o questionário PrEP
 
 import random
-import sqlite3
 from datetime import datetime, timedelta
 from database import salvar_resposta
+from conexao import conexao
 import sys
 
 def gerar_resposta_aleatoria():
@@ -137,19 +137,14 @@ def simular_respostas(quantidade=50):
             resposta = gerar_resposta_aleatoria()
             
             # Salvar diretamente no banco (sem usar Streamlit)
-            conn = sqlite3.connect('pesquisa_prep.db')
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            INSERT INTO respostas 
-            (idade, genero, orientacao_sexual, raca, escolaridade, renda, regiao, status_relacional,
-             conhecimento_prep, uso_prep, objetivo_prep, acesso_servico, fonte_info, barreiras, 
-             percepcao_risco, efeitos_colaterais_teve, efeitos_colaterais_quais, comentarios)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', tuple(resposta.values()))
-            
-            conn.commit()
-            conn.close()
+            with conexao() as conn:
+                conn.execute('''
+                INSERT INTO respostas 
+                (idade, genero, orientacao_sexual, raca, escolaridade, renda, regiao, status_relacional,
+                 conhecimento_prep, uso_prep, objetivo_prep, acesso_servico, fonte_info, barreiras, 
+                 percepcao_risco, efeitos_colaterais_teve, efeitos_colaterais_quais, comentarios)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', tuple(resposta.values()))
             
             sucessos += 1
             
@@ -168,11 +163,8 @@ def simular_respostas(quantidade=50):
     
     # Mostrar total atual
     try:
-        conn = sqlite3.connect('pesquisa_prep.db')
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM respostas")
-        total = cursor.fetchone()[0]
-        conn.close()
+        with conexao() as conn:
+            total = conn.execute("SELECT COUNT(*) FROM respostas").fetchone()[0]
         print(f"   Total no banco: {total}")
     except Exception as e:
         print(f"   Erro ao contar total: {e}")
@@ -189,36 +181,34 @@ def simular_respostas(quantidade=50):
 def mostrar_estatisticas():
     """Mostra estatísticas das respostas simuladas"""
     try:
-        conn = sqlite3.connect('pesquisa_prep.db')
-        cursor = conn.cursor()
-        
-        print("\n📊 Estatísticas das Respostas:")
-        print("-" * 40)
+        with conexao() as conn:
+            cursor = conn.cursor()
         
-        # Total
-        cursor.execute("SELECT COUNT(*) FROM respostas")
-        total = cursor.fetchone()[0]
-        print(f"Total de respostas: {total}")
+            print("\n📊 Estatísticas das Respostas:")
+            print("-" * 40)
         
-        # Conhecimento PrEP
-        cursor.execute("SELECT conhecimento_prep, COUNT(*) FROM respostas GROUP BY conhecimento_prep")
-        print("\nConhecimento sobre PrEP:")
-        for conhecimento, count in cursor.fetchall():
-            print(f"  {conhecimento}: {count}")
+            # Total
+            cursor.execute("SELECT COUNT(*) FROM respostas")
+            total = cursor.fetchone()[0]
+            print(f"Total de respostas: {total}")
         
-        # Escolaridade
-        cursor.execute("SELECT escolaridade, COUNT(*) FROM respostas GROUP BY escolaridade")
-        print("\nEscolaridade:")
-        for escolaridade, count in cursor.fetchall():
-            print(f"  {escolaridade}: {count}")
+            # Conhecimento PrEP
+            cursor.execute("SELECT conhecimento_prep, COUNT(*) FROM respostas GROUP BY conhecimento_prep")
+            print("\nConhecimento sobre PrEP:")
+            for conhecimento, count in cursor.fetchall():
+                print(f"  {conhecimento}: {count}")
         
-        # Renda
-        cursor.execute("SELECT renda, COUNT(*) FROM respostas GROUP BY renda")
-        print("\nRenda:")
-        for renda, count in cursor.fetchall():
-            print(f"  {renda}: {count}")
+            # Escolaridade
+            cursor.execute("SELECT escolaridade, COUNT(*) FROM respostas GROUP BY escolaridade")
+            print("\nEscolaridade:")
+            for escolaridade, count in cursor.fetchall():
+                print(f"  {escolaridade}: {count}")
         
-        conn.close()
+            # Renda
+            cursor.execute("SELECT renda, COUNT(*) FROM respostas GROUP BY renda")
+            print("\nRenda:")
+            for renda, count in cursor.fetchall():
+                print(f"  {renda}: {count}")
         
     except Exception as e:
         print(f"Erro ao mostrar estatísticas: {e}")
@@ -234,8 +224,8 @@ if __name__ == "__main__":
             sys.exit(1)
     
     # Criar tabela se não existir
-    from database import criar_tabela_respostas
-    criar_tabela_respostas()
+    from database import preparar_banco
+    preparar_banco()
     
     # Simular respostas
     simular_respostas(quantidade)
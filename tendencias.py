@@ -0,0 +1,171 @@
+# tendencias.py
+# Consolidação mensal incremental de dispensas e novos usuários, com taxas e projeções vetorizadas
+import json
+import numpy as np
+import pandas as pd
+from dados_publicos import CACHE_PATH, CHAVE_USUARIO, carregar_tabela, gravacao_atomica, trava_reconstrucao, versao_dataset
+from consultas_publicas import ler_dispensas, contar_dispensas_antes
+
+TENDENCIAS_PATH = CACHE_PATH / 'tendencias'
+ROLLUP_PATH = TENDENCIAS_PATH / 'rollup_mensal.parquet'
+PRIMEIRO_MES_PATH = TENDENCIAS_PATH / 'primeiro_mes.parquet'
+ESTADO_PATH = TENDENCIAS_PATH / 'estado.json'
+
+# Dimensões das séries (vindas do cadastro de usuários)
+DIMENSOES_TENDENCIA = ['UF_UDM', 'Pop_genero_pratica']
+SEM_INFORMACAO = 'Não informado'
+
+def _atributos_usuarios():
+    usuarios = carregar_tabela('usuarios', colunas=[CHAVE_USUARIO] + DIMENSOES_TENDENCIA)
+    usuarios = usuarios.drop_duplicates(CHAVE_USUARIO)
+    usuarios[CHAVE_USUARIO] = usuarios[CHAVE_USUARIO].astype(str)
+    return usuarios.set_index(CHAVE_USUARIO)
+
+def _ler_estado():
+    try:
+        with open(ESTADO_PATH, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def _gravar(rollup, primeiro_mes, estado):
+    for df, caminho in [(rollup, ROLLUP_PATH), (primeiro_mes, PRIMEIRO_MES_PATH)]:
+        with gravacao_atomica(caminho) as tmp_path:
+            df.to_parquet(tmp_path, index=False)
+    with gravacao_atomica(ESTADO_PATH) as tmp_path:
+        with open(tmp_path, 'w') as f:
+            json.dump(estado, f, indent=2)
+
+def _consolidar(blocos, atributos, primeiro_mes):
+    """Dobra os blocos de dispensas em contagens por (mês, UF, população).
+
+    'primeiro_mes' (Series usuário -> mês) é atualizado com o menor mês visto.
+    """
+    parciais = []
+    for bloco in blocos:
+        bloco['mes'] = bloco['dt_disp'].str.slice(0, 7)
+        bloco = bloco.dropna(subset=['mes'])
+        bloco[CHAVE_USUARIO] = bloco[CHAVE_USUARIO].astype(str)
+        bloco = bloco.join(atributos, on=CHAVE_USUARIO)
+        bloco[DIMENSOES_TENDENCIA] = bloco[DIMENSOES_TENDENCIA].astype(object).fillna(SEM_INFORMACAO)
+        parciais.append(bloco.groupby(['mes'] + DIMENSOES_TENDENCIA).size().rename('dispensas'))
+
+        minimo = bloco.groupby(CHAVE_USUARIO)['mes'].min()
+        primeiro_mes = pd.concat([primeiro_mes, minimo]).groupby(level=0).min()
+
+    if parciais:
+        dispensas = pd.concat(parciais).groupby(level=[0, 1, 2]).sum()
+    else:
+        dispensas = pd.Series(dtype='int64', name='dispensas')
+    return dispensas, primeiro_mes
+
+def _novos_usuarios(primeiro_mes, atributos, a_partir_de=None):
+    novos = primeiro_mes if a_partir_de is None else primeiro_mes[primeiro_mes >= a_partir_de]
+    novos = novos.rename('mes').to_frame().join(atributos)
+    novos[DIMENSOES_TENDENCIA] = novos[DIMENSOES_TENDENCIA].astype(object).fillna(SEM_INFORMACAO)
+    return novos.groupby(['mes'] + DIMENSOES_TENDENCIA).size().rename('novos_usuarios')
+
+def atualizar_rollup():
+    """Atualiza a consolidação mensal recalculando só os meses novos.
+
+    O último mês consolidado é sempre recalculado (pode ter chegado incompleto).
+    Se o histórico anterior a ele mudou, ou o cadastro de usuários mudou, tudo é refeito.
+    """
+    with trava_reconstrucao('tendencias'):
+        return _atualizar_rollup()
+
+def _atualizar_rollup():
+    versao_usuarios = versao_dataset('usuarios')
+    versao_dispensas = versao_dataset('dispensas')
+    estado = _ler_estado()
+
+    if estado and estado['versao_usuarios'] == versao_usuarios and estado['versao_dispensas'] == versao_dispensas:
+        return pd.read_parquet(ROLLUP_PATH)
+
+    incremental = (
+        estado is not None
+        and estado['versao_usuarios'] == versao_usuarios
+        and ROLLUP_PATH.exists() and PRIMEIRO_MES_PATH.exists()
+        and contar_dispensas_antes(f"{estado['ultimo_mes']}-01") == estado['dispensas_antes_ultimo_mes']
+    )
+
+    atributos = _atributos_usuarios()
+    if incremental:
+        desde = estado['ultimo_mes']
+        rollup = pd.read_parquet(ROLLUP_PATH)
+        rollup = rollup[rollup['mes'] < desde]
+        primeiro_mes = pd.read_parquet(PRIMEIRO_MES_PATH).set_index(CHAVE_USUARIO)['mes']
+        primeiro_mes = primeiro_mes[primeiro_mes < desde]
+    else:
+        desde = None
+        rollup = pd.DataFrame(columns=['mes'] + DIMENSOES_TENDENCIA + ['dispensas', 'novos_usuarios'])
+        primeiro_mes = pd.Series(dtype=object, name='mes')
+
+    blocos = ler_dispensas([CHAVE_USUARIO, 'dt_disp'], desde=f'{desde}-01' if desde else None)
+    dispensas, primeiro_mes = _consolidar(blocos, atributos, primeiro_mes)
+    primeiro_mes.index.name = CHAVE_USUARIO
+    novos = _novos_usuarios(primeiro_mes, atributos, a_partir_de=desde)
+
+    recalculado = pd.concat([dispensas, novos], axis=1).fillna(0).astype('int64').reset_index()
+    recalculado.columns = ['mes'] + DIMENSOES_TENDENCIA + ['dispensas', 'novos_usuarios']
+    rollup = pd.concat([rollup, recalculado], ignore_index=True).sort_values('mes', ignore_index=True)
+    rollup = rollup.astype({c: str for c in ['mes'] + DIMENSOES_TENDENCIA})
+    rollup = rollup.astype({'dispensas': 'int64', 'novos_usuarios': 'int64'})
+
+    ultimo_mes = rollup['mes'].max() if not rollup.empty else '1900-01'
+    _gravar(rollup, primeiro_mes.rename('mes').reset_index(), {
+        'versao_usuarios': versao_usuarios,
+        'versao_dispensas': versao_dispensas,
+        'ultimo_mes': ultimo_mes,
+        'dispensas_antes_ultimo_mes': contar_dispensas_antes(f'{ultimo_mes}-01'),
+        'recalculado_desde': desde,
+    })
+    return rollup
+
+def series_mensais(rollup, dimensao, metrica):
+    """Matriz meses x séries (uma coluna por valor da dimensão), com meses vazios em zero"""
+    matriz = rollup.pivot_table(index='mes', columns=dimensao, values=metrica, aggfunc='sum', fill_value=0)
+    if matriz.empty:
+        return matriz
+    meses = pd.period_range(matriz.index.min(), matriz.index.max(), freq='M')
+    matriz.index = pd.PeriodIndex(matriz.index, freq='M')
+    return matriz.reindex(meses, fill_value=0).astype('float64')
+
+def taxas(matriz, janela=3):
+    """Média móvel e variação em relação ao mesmo mês do ano anterior, para todas as séries"""
+    media_movel = matriz.rolling(janela, min_periods=1).mean()
+    anterior = matriz.shift(12)
+    variacao_anual = (matriz - anterior) / anterior.where(anterior != 0)
+    return media_movel, variacao_anual
+
+def projetar(matriz, horizonte=6, janela=36):
+    """Projeta todas as séries de uma vez com um único mínimos quadrados.
+
+    Modelo: nível + tendência linear, mais sazonalidade anual (seno/cosseno) quando
+    há pelo menos dois anos de histórico. Valores negativos são truncados em zero.
+    """
+    historico = matriz.iloc[-janela:]
+    n = len(historico)
+    if n < 3:
+        # Vazio, mas com o mesmo tipo de índice (meses) da projeção normal
+        return pd.DataFrame(columns=matriz.columns, index=pd.PeriodIndex([], freq='M'), dtype='float64')
+
+    def desenho(t):
+        colunas = [np.ones_like(t), t]
+        if n >= 24:
+            colunas += [np.sin(2 * np.pi * t / 12), np.cos(2 * np.pi * t / 12)]
+        return np.column_stack(colunas)
+
+    t = np.arange(n, dtype='float64')
+    coeficientes, *_ = np.linalg.lstsq(desenho(t), historico.to_numpy(), rcond=None)
+    futuro = np.arange(n, n + horizonte, dtype='float64')
+    previsto = np.clip(desenho(futuro) @ coeficientes, 0, None)
+
+    meses = pd.period_range(historico.index[-1] + 1, periods=horizonte, freq='M')
+    return pd.DataFrame(previsto, index=meses, columns=matriz.columns)
+
+if __name__ == "__main__":
+    rollup = atualizar_rollup()
+    estado = _ler_estado()
+    desde = estado['recalculado_desde'] or 'o início'
+    print(f"Consolidação com {len(rollup)} linhas até {estado['ultimo_mes']} (recalculado desde {desde})")
@@ -1,8 +1,8 @@
 # ui_pages.py
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-from database import salvar_resposta, buscar_respostas
+from database import salvar_resposta, buscar_respostas, importar_respostas_emergencia
+from graficos import grafico_pizza, grafico_barras, exibir_grafico
 
 def mostrar_pesquisa():
     """Exibe o formulário da pesquisa com perguntas simplificadas."""
@@ -169,18 +169,18 @@ def mostrar_analise_pesquisa():
     
     col1, col2 = st.columns(2)
     with col1:
-        fig_idade = px.pie(df, names='idade', title='Faixa Etária')
-        st.plotly_chart(fig_idade, use_container_width=True)
+        fig_idade = grafico_pizza(df, 'idade', titulo='Faixa Etária')
+        exibir_grafico(fig_idade)
         
-        fig_raca = px.bar(df['raca'].value_counts(), title='Raça/Cor')
-        st.plotly_chart(fig_raca, use_container_width=True)
+        fig_raca = grafico_barras(df, 'raca', titulo='Raça/Cor')
+        exibir_grafico(fig_raca)
         
     with col2:
-        fig_genero = px.pie(df, names='genero', title='Gênero')
-        st.plotly_chart(fig_genero, use_container_width=True)
+        fig_genero = grafico_pizza(df, 'genero', titulo='Gênero')
+        exibir_grafico(fig_genero)
         
-        fig_conhecimento = px.pie(df, names='conhecimento_prep', title='Conhecimento PrEP')
-        st.plotly_chart(fig_conhecimento, use_container_width=True)
+        fig_conhecimento = grafico_pizza(df, 'conhecimento_prep', titulo='Conhecimento PrEP')
+        exibir_grafico(fig_conhecimento)
 
 def mostrar_duvidas_frequentes():
     """Exibe uma seção com perguntas e respostas comuns sobre a PrEP."""
@@ -398,11 +398,22 @@ def mostrar_admin_backups():
     senha_admin = st.text_input("Senha de Administrador:", type="password")
     
     if senha_admin == "prep2025admin":  # Senha simples - pode ser alterada
-        from backup_manager import BackupManager
+        from backup_manager import BackupManager, obter_agendador
         import os
         
         backup_manager = BackupManager()
         
+        st.subheader("⏱️ Backup Automático")
+        status = obter_agendador().status()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Respostas sem backup", status['pendentes'])
+        col2.metric("Atraso do backup", f"{status['atraso_s']:.0f} s")
+        col3.metric("Último backup", status['ultimo_backup'][11:19] if status['ultimo_backup'] else "—")
+        st.caption(f"Backup a cada {status['intervalo_s']:.0f} s ou a cada {status['max_respostas']} respostas novas"
+                   + (" · backup em andamento" if status['em_execucao'] else ""))
+        if status['ultimo_erro']:
+            st.error(f"Último backup automático falhou: {status['ultimo_erro']}")
+        
         col1, col2, col3 = st.columns(3)
         
         with col1:
@@ -419,8 +430,14 @@ def mostrar_admin_backups():
         
         with col2:
             if st.button("💾 Criar Backup Manual"):
-                resultado = backup_manager.backup_completo()
-                st.success("Backup criado com sucesso!")
+                barra = st.progress(0.0, text="Copiando o banco...")
+                resultado = backup_manager.backup_completo(
+                    progresso=lambda fracao: barra.progress(fracao, text=f"Copiando o banco... {fracao:.0%}"))
+                barra.progress(1.0, text="Cópia do banco concluída")
+                if resultado['db_inalterado']:
+                    st.info("Banco sem alterações desde o último backup; nenhuma cópia nova foi feita.")
+                else:
+                    st.success("Backup criado com sucesso!")
                 st.json(resultado)
         
         with col3:
@@ -433,6 +450,9 @@ def mostrar_admin_backups():
                 st.write("**Arquivos CSV/JSON:**")
                 for backup in backups['csv_backups']:
                     st.write(f"- {backup}")
+                st.write("**Exportação incremental (snapshot + segmentos):**")
+                for backup in backups['exportacao_incremental']:
+                    st.write(f"- {backup}")
         
         st.subheader("📥 Exportar Dados")
         
@@ -445,7 +465,8 @@ def mostrar_admin_backups():
                     st.success(f"CSV exportado: {os.path.basename(csv_path)}")
                     
                     # Permitir download
-                    df = pd.read_sql("SELECT * FROM respostas", sqlite3.connect('pesquisa_prep.db'))
+                    with conexao() as conn:
+                        df = pd.read_sql("SELECT * FROM respostas", conn)
                     csv = df.to_csv(index=False)
                     st.download_button(
                         label="⬇️ Download CSV",
@@ -461,7 +482,8 @@ def mostrar_admin_backups():
                     st.success(f"JSON exportado: {os.path.basename(json_path)}")
                     
                     # Permitir download
-                    df = pd.read_sql("SELECT * FROM respostas", sqlite3.connect('pesquisa_prep.db'))
+                    with conexao() as conn:
+                        df = pd.read_sql("SELECT * FROM respostas", conn)
                     json_data = df.to_json(orient='records', date_format='iso', indent=2)
                     st.download_button(
                         label="⬇️ Download JSON",
@@ -470,54 +492,75 @@ def mostrar_admin_backups():
                         mime="application/json"
                     )
         
+        st.subheader("🧩 Exportação Incremental")
+        estado = backup_manager.ler_estado_exportacao()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Último id exportado", estado['ultimo_id'])
+        col2.metric("Segmentos", len(estado['segmentos']))
+        col3.metric("Snapshot até o id", estado['snapshot']['ate_id'] if estado['snapshot'] else "—")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("🗜️ Compactar Segmentos"):
+                snapshot = backup_manager.compactar_exportacoes()
+                if snapshot:
+                    st.success(f"Snapshot até o id {snapshot['ate_id']} criado")
+        with col2:
+            ate_id = st.number_input("Reconstruir exportação até o id (0 = atual):", min_value=0,
+                                     value=0, step=1)
+            if st.button("🧱 Reconstruir Exportação"):
+                df = backup_manager.reconstruir_exportacao(ate_id or None)
+                st.download_button(
+                    label=f"⬇️ Download CSV ({len(df)} respostas)",
+                    data=df.to_csv(index=False),
+                    file_name=f"respostas_prep_ate_{ate_id or estado['ultimo_id']}.csv",
+                    mime="text/csv"
+                )
+        
+        st.subheader("♻️ Restaurar Backup do Banco")
+        backups_db = backup_manager.listar_backups()['db_backups']
+        if backups_db:
+            escolhido = st.selectbox("Backup:", backups_db)
+            confirmar = st.checkbox("Entendo que as respostas gravadas depois deste backup serão substituídas")
+            if st.button("♻️ Restaurar", disabled=not confirmar):
+                barra = st.progress(0.0, text="Restaurando...")
+                restaurado = backup_manager.restaurar_backup(
+                    os.path.join(backup_manager.backup_dir, escolhido),
+                    progresso=lambda fracao: barra.progress(fracao, text=f"Restaurando... {fracao:.0%}"))
+                if restaurado:
+                    barra.progress(1.0, text="Restauração concluída")
+                    st.success(f"Banco restaurado a partir de {escolhido}")
+                else:
+                    st.error("Backup inválido ou falha na restauração; o banco atual não foi alterado.")
+        else:
+            st.info("Nenhum backup do banco disponível.")
+        
         st.subheader("🔄 Recuperação de Emergência")
         
         if os.path.exists('respostas_emergencia.csv'):
             st.warning("⚠️ Arquivo de emergência encontrado!")
             if st.button("🔄 Importar Respostas de Emergência"):
                 try:
-                    emergency_df = pd.read_csv('respostas_emergencia.csv')
-                    
-                    # Conectar ao banco e importar
-                    conn = sqlite3.connect('pesquisa_prep.db')
-                    
-                    for _, row in emergency_df.iterrows():
-                        # Remover timestamp se existir
-                        row_dict = row.to_dict()
-                        if 'timestamp' in row_dict:
-                            del row_dict['timestamp']
-                        
-                        # Inserir no banco
-                        cursor = conn.cursor()
-                        cursor.execute('''
-                        INSERT INTO respostas 
-                        (idade, genero, orientacao_sexual, raca, escolaridade, renda, regiao, status_relacional,
-                         conhecimento_prep, uso_prep, objetivo_prep, acesso_servico, fonte_info, barreiras, 
-                         percepcao_risco, efeitos_colaterais_teve, efeitos_colaterais_quais, comentarios)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        ''', tuple(row_dict.values()))
-                    
-                    conn.commit()
-                    conn.close()
+                    relatorio = importar_respostas_emergencia('respostas_emergencia.csv')
                     
                     # Renomear arquivo de emergência
                     os.rename('respostas_emergencia.csv', f'respostas_emergencia_importado_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv')
                     
-                    st.success(f"✅ {len(emergency_df)} respostas de emergência importadas com sucesso!")
-                    st.rerun()
+                    st.success(f"✅ {relatorio['inseridas']} respostas de emergência importadas "
+                               f"({relatorio['duplicadas']} já estavam no banco) em {relatorio['segundos']:.2f} s "
+                               f"· {relatorio['linhas_por_s']:,.0f} linhas/s")
+                    if relatorio['colunas_ignoradas']:
+                        st.warning(f"Colunas sem correspondência ignoradas: {', '.join(relatorio['colunas_ignoradas'])}")
                     
                 except Exception as e:
                     st.error(f"Erro ao importar: {e}")
         
         # Log de backups
-        if os.path.exists('backups/backup_log.json'):
+        logs = backup_manager.ultimos_logs(5)
+        if logs:
             st.subheader("📜 Histórico de Backups")
-            with open('backups/backup_log.json', 'r') as f:
-                import json
-                logs = json.load(f)
-                
             # Mostrar últimos 5 backups
-            for log in logs[-5:]:
+            for log in reversed(logs):
                 with st.expander(f"Backup {log['timestamp']}"):
                     st.json(log)
     
@@ -527,5 +570,5 @@ def mostrar_admin_backups():
     else:
         st.info("Digite a senha de administrador para acessar os controles de backup.")
 
-import sqlite3
+from conexao import conexao
 from datetime import datetime